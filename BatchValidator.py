@@ -0,0 +1,149 @@
+import argparse
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from Propagation import boxSizeOf
+from PuzzleBank import HEADER, getBank
+
+# puzzles validated at once, bounds the memory of the temporary arrays
+CHUNK_SIZE = 1 << 16
+
+# the value bits of a unit and the number of its values share a 64 bit word (values go up to 25)
+COUNT_SHIFT = 40
+VALUE_BITS = (1 << COUNT_SHIFT) - 1
+
+# bit of every value plus one in the count
+UNIT_BITS = np.array([0] + [(1 << value) | (1 << COUNT_SHIFT) for value in range(1, 26)], dtype=np.uint64)
+
+
+class BatchResult(NamedTuple):
+    # per puzzle results of validateBatch, values are the puzzles after naked singles
+    # and candidates the candidate masks of their empty cells (bit v => value v)
+    valid: np.ndarray
+    solved: np.ndarray
+    values: np.ndarray
+    candidates: np.ndarray
+
+
+def _popcount(masks):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(masks)
+
+    masks = masks - ((masks >> 1) & 0x55555555)
+    masks = (masks & 0x33333333) + ((masks >> 2) & 0x33333333)
+    masks = (masks + (masks >> 4)) & 0x0F0F0F0F
+    return (masks * np.uint32(0x01010101)) >> 24
+
+
+def _unitState(values, boxSize):
+    # candidate masks of every cell and whether a unit of the puzzle holds a value twice,
+    # values are (cells, puzzles) => every reduction below adds up whole rows of puzzles
+    size, count = boxSize * boxSize, values.shape[1]
+
+    # the number of values of a unit is added up above the bits of the values,
+    # the sum has fewer bits than the unit has values exactly when one repeats
+    bits = UNIT_BITS[values]
+    bits = bits.reshape(size, size, count)
+
+    # the cells of the box (by, bx) are [by, :, bx, :] of the (boxSize, boxSize, boxSize, boxSize, count) view
+    boxShape = (boxSize, boxSize, boxSize, boxSize, count)
+    duplicates = np.zeros(count, dtype=bool)
+    used = np.zeros((size, size, count), dtype=np.uint32)
+    for sums, expand in ((bits.sum(axis=1), lambda masks: masks[:, None]),
+                         (bits.sum(axis=0), lambda masks: masks[None, :]),
+                         (bits.reshape(boxShape).sum(axis=(1, 3)),
+                          lambda masks: np.broadcast_to(masks[:, None, :, None], boxShape).reshape(size, size, count))):
+        masks = (sums & np.uint64(VALUE_BITS)).astype(np.uint32)
+        duplicates |= (_popcount(masks) != sums >> np.uint64(COUNT_SHIFT)).reshape(-1, count).any(axis=0)
+        used |= expand(masks)
+
+    candidates = (~used & np.uint32((1 << (size + 1)) - 2)).reshape(size * size, count)
+    candidates[values != 0] = 0
+    return candidates, duplicates
+
+
+def validateBatch(puzzles, propagate=True):
+    # validate an (N, cells) array of puzzles at once, a puzzle is valid when its givens don't repeat
+    # in a unit and naked singles don't run into a cell without candidates,
+    # it is solved when naked singles fill it completely
+    puzzles = np.asarray(puzzles)
+    if puzzles.ndim != 2:
+        raise ValueError("puzzles must be an (N, cells) array")
+    boxSize = boxSizeOf(puzzles.shape[1])
+    if puzzles.size and (puzzles.min() < 0 or puzzles.max() > boxSize * boxSize):
+        raise ValueError(f"values must be between 0 and {boxSize * boxSize}")
+
+    # puzzles are the columns while propagating, the results are written back as rows
+    values = np.ascontiguousarray(puzzles.T, dtype=np.uint8)
+    candidates, duplicates = _unitState(values, boxSize)
+    valid = ~duplicates & ~((values == 0) & (candidates == 0)).any(axis=0)
+    resultValues, resultCandidates = values.T.copy(), candidates.T.copy()
+
+    # only the puzzles that are still valid and changed in the last round are propagated again,
+    # a puzzle is written back once it stops changing
+    todo = np.flatnonzero(valid) if propagate else np.zeros(0, dtype=np.intp)
+    values, candidates = values[:, todo], candidates[:, todo]
+    while todo.size:
+        singles = (values == 0) & (_popcount(candidates) == 1)
+        changed = singles.any(axis=0)
+        if not changed.all():
+            done = ~changed
+            resultValues[todo[done]], resultCandidates[todo[done]] = values[:, done].T, candidates[:, done].T
+            todo, values, candidates, singles = todo[changed], values[:, changed], candidates[:, changed], singles[:, changed]
+            if not todo.size:
+                break
+
+        # the value of a single candidate 1 << v is the number of bits of (1 << v) - 1
+        values += np.where(singles, _popcount(candidates - np.uint32(1)), 0).astype(np.uint8)
+        candidates, duplicates = _unitState(values, boxSize)
+
+        # two singles of the same value in a unit or a cell without candidates => no solution
+        broken = duplicates | ((values == 0) & (candidates == 0)).any(axis=0)
+        if broken.any():
+            valid[todo[broken]] = False
+            resultValues[todo[broken]], resultCandidates[todo[broken]] = values[:, broken].T, candidates[:, broken].T
+            todo, values, candidates = todo[~broken], values[:, ~broken], candidates[:, ~broken]
+
+    solved = valid & (resultValues != 0).all(axis=1)
+    return BatchResult(valid, solved, resultValues, resultCandidates)
+
+
+def bankArray(bank, start=0, count=None):
+    # puzzles start to start + count of a puzzle bank as an (count, cells) uint8 array
+    count = bank.count - start if count is None else min(count, bank.count - start)
+    first = HEADER.size + start * bank.recordSize
+    records = np.frombuffer(bank.mmap[first:first + count * bank.recordSize], dtype=np.uint8)
+    records = records.reshape(count, bank.recordSize)
+    if bank.bits == 8:
+        return records[:, :bank.cells].copy()
+    return np.stack((records >> 4, records & 0x0F), axis=2).reshape(count, -1)[:, :bank.cells]
+
+
+def validateBank(bank, chunkSize=CHUNK_SIZE, propagate=True):
+    # validity and solvedness (by naked singles) of every puzzle of a bank, chunk by chunk
+    valid = np.zeros(bank.count, dtype=bool)
+    solved = np.zeros(bank.count, dtype=bool)
+    for start in range(0, bank.count, chunkSize):
+        result = validateBatch(bankArray(bank, start, chunkSize), propagate)
+        valid[start:start + len(result.valid)] = result.valid
+        solved[start:start + len(result.solved)] = result.solved
+    return valid, solved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Validate every puzzle of a puzzle bank at once.")
+    parser.add_argument("csvPath", nargs='?', default='preGeneratedSudokuBoards.csv')
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    bank = getBank(args.csvPath)
+    startTime = time.perf_counter()
+    valid, solved = validateBank(bank, args.chunk_size)
+    seconds = time.perf_counter() - startTime
+
+    for index in np.flatnonzero(~valid):
+        print(f"ERROR: {index}")
+    print(f"{bank.count} puzzles in {seconds:.2f}s: {np.count_nonzero(valid)} valid, "
+          f"{np.count_nonzero(solved)} solved by naked singles")
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Board import Board
+from PuzzleBank import getBank, parsePuzzle
+from Solver import Solver
+
+SOLVER_TYPES = ["backtracking", "propagation", "dlx"]
+
+# well known puzzles that are hard for humans and for naive search
+HARD_PUZZLES = {
+    "ai escargot": "1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..",
+    "inkala 2012": "8..........36......7..9.2...5...7.......457.....1...3...1....68..85...1..9....4..",
+    "easter monster": "1.......2.9.4...5...6...7...5.9.3.......7.......85..4.7.....6...3...9.8...2.....1",
+    "norvig hardest": "85...24..72......9..4.........1.7..23.5...9...4...........8..7..17..........36.4.",
+    "hardest list 3": "..53.....8......2..7..1.5..4....53...1..7...6..32...8..6.5....9..4....3......97..",
+}
+
+# puzzles used for the tracemalloc pass, it slows everything down
+MEMORY_SAMPLE = 20
+
+# modules whose import time is measured => the engine and the cli must not pay for pygame
+IMPORT_MODULES = ["Board", "Solver", "Main", "Graphics"]
+
+
+def percentile(sortedValues, p):
+    if not sortedValues:
+        return 0.0
+    return sortedValues[min(len(sortedValues) - 1, int(p / 100 * len(sortedValues)))]
+
+
+def checkUnique(puzzles):
+    # every puzzle has to have exactly one solution => once with dlx and before anything is timed,
+    # counting the solutions with backtracking would take longer than the benchmark
+    for puzzle in puzzles:
+        board = Board()
+        board.setBoardWithDefaultValues(puzzle)
+        if Solver(board, "dlx", cache=None).solve(2) != 1:
+            raise RuntimeError(f"{puzzle} doesn't have exactly one solution")
+
+
+def solveAll(solverType, puzzles):
+    # solve every puzzle on a fresh board, returns the latencies in seconds and the search nodes
+    latencies = []
+    nodes = []
+    for puzzle in puzzles:
+        board = Board()
+        board.setBoardWithDefaultValues(puzzle)
+        # every solver has to search, not look up what the one before it found
+        solver = Solver(board, solverType, cache=None)
+
+        startTime = time.perf_counter()
+        if solver.solve() != 1:
+            raise RuntimeError(f"{solverType} didn't solve {puzzle}")
+        latencies.append(time.perf_counter() - startTime)
+        nodes.append(solver.nodes)
+    return latencies, nodes
+
+
+def benchmarkSolver(solverType, puzzles):
+    latencies, nodes = solveAll(solverType, puzzles)
+
+    tracemalloc.start()
+    solveAll(solverType, puzzles[:MEMORY_SAMPLE])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        "puzzles": len(puzzles),
+        "seconds": total,
+        "solves_per_second": len(puzzles) / total if total else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "nodes_total": sum(nodes),
+        "nodes_max": max(nodes, default=0),
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def benchmarkGenerator(numberOfPuzzles, seed=0):
+    rng = random.Random(seed)
+    board = Board()
+    latencies = []
+    for _ in range(numberOfPuzzles):
+        startTime = time.perf_counter()
+        board.generatePuzzle(rng=rng)
+        latencies.append(time.perf_counter() - startTime)
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        "puzzles": numberOfPuzzles,
+        "seconds": total,
+        "puzzles_per_second": numberOfPuzzles / total if total else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def importTime(module, repeat=5):
+    # milliseconds to import module in a fresh interpreter, the fastest of repeat runs,
+    # None when it can't be imported (pygame isn't installed for example)
+    code = f"import time; startTime = time.perf_counter(); import {module}; print(time.perf_counter() - startTime)"
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    times = []
+    for _ in range(repeat):
+        try:
+            output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                    env=env).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        times.append(float(output.split()[-1]))
+    return min(times) * 1000
+
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runBenchmarks(csvPath='preGeneratedSudokuBoards.csv', solverTypes=None, limit=None, generate=20):
+    bank = getBank(csvPath)
+    corpus = [bank[index] for index in range(min(len(bank), limit or len(bank)))]
+    hard = [parsePuzzle(line) for line in HARD_PUZZLES.values()]
+    checkUnique(corpus + hard)
+
+    results = {
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "solvers": {},
+    }
+
+    for solverType in solverTypes or SOLVER_TYPES:
+        results["solvers"][solverType] = {}
+        for name, puzzles in (("corpus", corpus), ("hard", hard)):
+            result = benchmarkSolver(solverType, puzzles)
+            results["solvers"][solverType][name] = result
+            print(f"{solverType:>12} {name:>6}: {result['solves_per_second']:9.1f} solves/s  "
+                  f"p50 {result['p50_ms']:8.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+                  f"nodes {result['nodes_total']:>8}  peak {result['peak_memory_kb']:8.1f} KiB")
+
+    results["imports_ms"] = {module: importTime(module) for module in IMPORT_MODULES}
+    print("     imports: " + "  ".join(f"{module} {milliseconds:.1f} ms" for module, milliseconds
+                                     in results["imports_ms"].items() if milliseconds is not None))
+
+    if generate:
+        result = benchmarkGenerator(generate)
+        results["generator"] = result
+        print(f"{'generator':>12}: {result['puzzles_per_second']:9.1f} puzzles/s  "
+              f"p50 {result['p50_ms']:8.3f} ms  p99 {result['p99_ms']:9.3f} ms")
+
+    return results
+
+
+def compareResults(old, new):
+    # print the change of the throughput of every benchmark that is in both results
+    print(f"compared to {old.get('commit')}:")
+    for solverType, sets in new["solvers"].items():
+        for name, result in sets.items():
+            oldResult = old.get("solvers", {}).get(solverType, {}).get(name)
+            if oldResult and oldResult["solves_per_second"]:
+                change = result["solves_per_second"] / oldResult["solves_per_second"] - 1
+                print(f"{solverType:>12} {name:>6}: {change:+8.1%} solves/s")
+
+    for module, milliseconds in new.get("imports_ms", {}).items():
+        oldMilliseconds = old.get("imports_ms", {}).get(module)
+        if milliseconds is not None and oldMilliseconds:
+            print(f"{'import':>12} {module:>8}: {milliseconds - oldMilliseconds:+8.1f} ms")
+
+    if "generator" in new and old.get("generator", {}).get("puzzles_per_second"):
+        change = new["generator"]["puzzles_per_second"] / old["generator"]["puzzles_per_second"] - 1
+        print(f"{'generator':>12}: {change:+8.1%} puzzles/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the solvers and the puzzle generator.")
+    parser.add_argument("--csv", default='preGeneratedSudokuBoards.csv')
+    parser.add_argument("--solvers", nargs='+', choices=SOLVER_TYPES, default=None)
+    parser.add_argument("--limit", type=int, default=None, help="number of corpus puzzles to solve")
+    parser.add_argument("--generate", type=int, default=20, help="number of puzzles to generate, 0 to skip")
+    parser.add_argument("--output", default=None, help="json file for the results")
+    parser.add_argument("--compare", default=None, help="json file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    benchmarkResults = runBenchmarks(args.csv, args.solvers, args.limit, args.generate)
+    if args.compare:
+        with open(args.compare) as f:
+            compareResults(json.load(f), benchmarkResults)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(benchmarkResults, f, indent=2)
@@ -1,70 +1,213 @@
 import csv
+import os
 import random
-from typing import List
+import time
+from array import array
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+import Instrumentation
+from Canonical import applyTransform, canonicalForm, randomTransform, solutionCache
+from Grader import getRatings
 from Node import Node
+from Propagation import PropagationSolver, boxSizeOf, getTables
+from PuzzleBank import getBank
+from SaveFile import SAVE_PATH, SaveFile
+from Variants import Variant, randomCages, randomRegions
+
+# search nodes allowed for one uniqueness check of generatePuzzle, by box size,
+# a check that runs out keeps the node as a given => big boards get a few more givens
+# but are generated in seconds instead of hours
+GENERATOR_SEARCH_NODES = {2: 100_000, 3: 100_000, 4: 50, 5: 20}
+
+# csv save of older versions of the game => a row of givens, a row of user values and the variant as json
+LEGACY_SAVE_PATH = 'savedBoard.csv'
+
+
+class Layout(NamedTuple):
+    # tables that only depend on the size and the variant of a board => shared by all boards of the variant
+    # box (or jigsaw region) of every node and the nodes of every box
+    box_of: Tuple[int, ...]
+    box_cells: Tuple[Tuple[int, ...], ...]
+    # units of the variant on top of rows, columns and boxes => diagonals and killer cages,
+    # with the sum of every unit (0 => no sum) and the extra units of every node
+    extra_units: Tuple[Tuple[int, ...], ...]
+    extra_totals: Tuple[int, ...]
+    extra_units_of: Tuple[Tuple[int, ...], ...]
+    # (box, extra units) of every node => one lookup in the hot paths
+    node_units: Tuple[Tuple[int, Tuple[int, ...]], ...]
+
+
+@lru_cache(maxsize=16)
+def getLayout(variant):
+    size = variant.boxSize * variant.boxSize
+    box_of = tuple(variant.regionOf())
+    box_cells = [[] for _ in range(size)]
+    for index, box in enumerate(box_of):
+        box_cells[box].append(index)
+
+    extra_units = [tuple(unit) for unit in variant.extraUnits()] + [tuple(cage) for _, cage in variant.cages]
+    extra_totals = (0,) * (len(extra_units) - len(variant.cages)) + tuple(total for total, _ in variant.cages)
+    extra_units_of = [()] * (size * size)
+    for unit, cells in enumerate(extra_units):
+        for index in cells:
+            extra_units_of[index] += (unit,)
+
+    return Layout(box_of, tuple(tuple(cells) for cells in box_cells), tuple(extra_units), extra_totals,
+                  tuple(extra_units_of), tuple(zip(box_of, extra_units_of)))
 
 
 class Board:
-    def __init__(self):
-        # sudoku 9x9
-        self.width = 9
-        self.height = 9
-
-        # 2d board with all sudoku Nodes
-        self.board: List[List[Node]] = []
-        self.row_possible_values = [i for i in range(1, 10)]
-        self.col_possible_values = [i for i in range(1, 10)]
-        self.square_possible_values = [i for i in range(1, 10)]
-
-
-    def saveBoard(self):
-        open('savedBoard.csv', 'w').close()
-        with open('savedBoard.csv', 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(self.getValuesDefault())
-            writer.writerow(self.getValuesUser())
-
-    def loadBoard(self):
-        with open('savedBoard.csv', 'rt') as f:
+    def __init__(self, boxSize=3, variant=None):
+        # auto notes => setValue keeps the candidates of every empty node, see setAutoNotes
+        self.auto_notes = False
+        self.setBoxSize(boxSize, variant)
+
+    def setBoxSize(self, boxSize, variant=None):
+        # sudoku of (boxSize * boxSize) x (boxSize * boxSize) nodes, 3 => 9x9, the board is emptied,
+        # variant sets the rules of a sudoku variant (see Variants.Variant), None => classic sudoku
+        if variant is not None:
+            boxSize = variant.boxSize
+        self.variant = variant or Variant(boxSize=boxSize)
+        self.box_size = boxSize
+        self.width = boxSize * boxSize
+        self.height = boxSize * boxSize
+
+        # bits 1..width => every value
+        self.all_values = (1 << (self.width + 1)) - 2
+
+        # compact board state, one byte per node stored row by row => index = y * width + x
+        self.values = bytearray(self.width * self.height)
+        self.givens = bytearray(self.width * self.height)
+
+        # pencil notes, bit v is set when the note v is shown on the node
+        self.notes_type = 'H' if self.width < 16 else 'I'
+        self.notes = array(self.notes_type, [0] * (self.width * self.height))
+
+        # views of all sudoku Nodes, made on first use (see board) => copies and boards of the solvers don't pay
+        self.node_views = None
+
+        # boxes, extra units and their sums, shared with every board of the variant, see Layout
+        self.box_of, self.box_cells, self.extra_units, self.extra_totals, self.extra_units_of, self.node_units = \
+            getLayout(self.variant)
+
+        # bitmask indexes of the values used in every row, column and box
+        # (bit v is set when value v is present), kept up to date by setValue
+        self.row_masks: List[int] = []
+        self.col_masks: List[int] = []
+        self.box_masks: List[int] = []
+
+        # how many times each value is present in every row, column and box,
+        # the masks stay correct even when the user enters conflicting values
+        self.row_counts: List[List[int]] = []
+        self.col_counts: List[List[int]] = []
+        self.box_counts: List[List[int]] = []
+
+        # the same for the extra units, with the sum and the number of values in every one
+        self.extra_masks: List[int] = []
+        self.extra_counts: List[List[int]] = []
+        self.extra_sums: List[int] = []
+        self.extra_filled: List[int] = []
+
+        # number of empty nodes and of (unit, value) pairs that hold the value more than once,
+        # both kept up to date by setValue
+        self.empty_count = self.width * self.height
+        self.conflict_count = 0
+
+        # with auto notes the candidate mask of every node (0 for nodes with a value) and the nodes that share
+        # a unit with every node, whose candidates setValue updates
+        self.candidate_masks = None
+        self.peers: List[List[int]] = []
+        self.resetMasks()
+
+        # solution of the givens, None => not known yet (see getSolution), () => the givens don't have
+        # exactly one solution, forgotten whenever the givens change
+        self.solution = None
+
+    @property
+    def board(self) -> List[List[Node]]:
+        # 2d board with views of all sudoku Nodes
+        if self.node_views is None:
+            self.node_views = [[Node(self, x, y) for x in range(self.width)] for y in range(self.height)]
+        return self.node_views
+
+    def saveBoard(self, saveFile=None):
+        # a new snapshot of the board in the binary save file, see SaveFile
+        (saveFile or SaveFile()).save(self)
+
+    def loadBoard(self, saveFile=None):
+        # the binary save file or the csv save of older versions when there is none
+        if (saveFile or SaveFile()).load(self):
+            return
+
+        with open(LEGACY_SAVE_PATH, 'rt') as f:
             reader = list(csv.reader(f, delimiter=','))
-            self.setBoardWithDefaultValues(reader[0])
-            self.setBoardWithUserValues(reader[1])
+            variant = Variant.fromJson(reader[2][0]) if len(reader) > 2 else Variant(boxSize=boxSizeOf(len(reader[0])))
+            if variant != self.variant:
+                self.setBoxSize(variant.boxSize, variant)
+            self.setBoardWithDefaultValues([int(value) for value in reader[0]])
+            self.setBoardWithUserValues([int(value) for value in reader[1]])
+
+    @staticmethod
+    def hasSavedBoard():
+        return os.path.exists(SAVE_PATH) or os.path.exists(LEGACY_SAVE_PATH)
 
     def getValuesDefault(self):
-        output = []
-        for line in self.board:
-            for node in line:
-                if node.user_cannot_change:
-                    output.append(node.value)
-                else:
-                    output.append(0)
-        return output
+        return [value if given else 0 for value, given in zip(self.values, self.givens)]
 
     def getValuesUser(self):
-        output = []
-        for line in self.board:
-            for node in line:
-                if not node.user_cannot_change:
-                    output.append(node.value)
-                else:
-                    output.append(0)
-        return output
+        return [0 if given else value for value, given in zip(self.values, self.givens)]
 
     def getValues(self):
-        output = []
-        for line in self.board:
-            for node in line:
-                output.append(node.value)
-
-        return output
+        return list(self.values)
+
+    def getState(self):
+        # the whole board as one bytes object => values, givens and notes,
+        # it can only be set on a board of the same size
+        return bytes(self.values) + bytes(self.givens) + self.notes.tobytes()
+
+    def setState(self, state, variant=None, solution=None):
+        # variant => the state belongs to a board with other rules, solution => the solution of its givens
+        if variant is not None and variant != self.variant:
+            self.setBoxSize(variant.boxSize, variant)
+
+        size = len(self.values)
+        self.fillBoard()
+        for index, value in enumerate(state[:size]):
+            if value:
+                self.setValue(index % self.width, index // self.width, value)
+        self.givens[:] = state[size:2 * size]
+        self.notes = array(self.notes_type)
+        self.notes.frombytes(state[2 * size:])
+        self.solution = solution
+
+    def copy(self):
+        # the buffers and the counters are copied, the tables of the variant are shared
+        board = Board.__new__(Board)
+        # methods replaced on the instance (see Instrumentation.counting) stay with this board
+        board.__dict__.update((name, value) for name, value in self.__dict__.items() if not callable(value))
+        board.node_views = None
+        board.values, board.givens = self.values[:], self.givens[:]
+        board.notes = array(self.notes_type, self.notes)
+
+        board.row_masks, board.col_masks, board.box_masks = self.row_masks[:], self.col_masks[:], self.box_masks[:]
+        board.row_counts = [counts[:] for counts in self.row_counts]
+        board.col_counts = [counts[:] for counts in self.col_counts]
+        board.box_counts = [counts[:] for counts in self.box_counts]
+        board.extra_masks, board.extra_sums, board.extra_filled = \
+            self.extra_masks[:], self.extra_sums[:], self.extra_filled[:]
+        board.extra_counts = [counts[:] for counts in self.extra_counts]
+        if self.candidate_masks is not None:
+            board.candidate_masks = array(self.notes_type, self.candidate_masks)
+        return board
 
     def setBoardWithDefaultValues(self, values):
         # set all node value to a newly chosen value
+        self.solution = None
         index = 0
         for y in range(self.height):
             for x in range(self.width):
                 self.setValue(x, y, values[index])
-                self.getBoardNode(x, y).user_cannot_change = str(values[index]) != "0"
+                self.givens[index] = values[index] != 0
                 index += 1
 
     def setBoardWithUserValues(self, values):
@@ -72,27 +215,50 @@ class Board:
         index = 0
         for y in range(self.height):
             for x in range(self.width):
-                if not self.getBoardNode(x, y).user_cannot_change:
+                if not self.givens[index]:
                     self.setValue(x, y, values[index])
 
                 index += 1
 
     def fillBoard(self):
-        # reset board
-        self.board: List[List[Node]] = []
+        # reset board => all nodes have value zero
+        size = self.width * self.height
+        self.values[:] = bytes(size)
+        self.givens[:] = bytes(size)
+        self.notes = array(self.notes_type, [0] * size)
+        self.solution = None
 
-        # create new board with nodes that have value zero
-        for y in range(self.height):
-            helperList = []
-            for x in range(self.width):
-                helperList.append(Node(x, y, 0))
-            self.board.append(helperList)
+        self.resetMasks()
+
+    def resetMasks(self):
+        self.row_masks = [0] * self.height
+        self.col_masks = [0] * self.width
+        self.box_masks = [0] * self.width
+
+        self.row_counts = [[0] * (self.width + 1) for _ in range(self.height)]
+        self.col_counts = [[0] * (self.width + 1) for _ in range(self.width)]
+        self.box_counts = [[0] * (self.width + 1) for _ in range(self.width)]
+
+        self.extra_masks = [0] * len(self.extra_units)
+        self.extra_counts = [[0] * (self.width + 1) for _ in self.extra_units]
+        self.extra_sums = [0] * len(self.extra_units)
+        self.extra_filled = [0] * len(self.extra_units)
+
+        self.empty_count = self.values.count(0)
+        self.conflict_count = 0
+
+        if self.auto_notes:
+            self.setAutoNotes(True)
+
+    def getBoxIndex(self, x, y):
+        return self.box_of[y * self.width + x]
 
     def resetNodesOnBoard(self, nodes):
         # reset all node value to zero
         for node in nodes:
             self.setValue(node.x, node.y, 0)
-            self.getBoardNode(node.x, node.y).userCannotChange = False
+            self.givens[node.y * self.width + node.x] = False
+        self.solution = None
 
     def resetNodesOnBoardThatUserChanged(self):
         # reset all node value to zero that user changed
@@ -104,41 +270,89 @@ class Board:
 
 
     def isNodeValid(self, node_x, node_y, value, check_only_if_is_valid=False):
+        bit = 1 << value
+        index = node_y * self.width + node_x
+        box, extraUnits = self.node_units[index]
+        used = self.row_masks[node_y] | self.col_masks[node_x] | self.box_masks[box]
+        if extraUnits:
+            for unit in extraUnits:
+                used |= self.extra_masks[unit]
+
+        if check_only_if_is_valid:
+            if extraUnits and value and not used & bit:
+                return self.fitsCageSums(index, value)
+            return value == 0 or not used & bit
+
         output = []
+        if value == 0 or not used & bit:
+            return output
+
+        # the value is used somewhere => collect the conflicting nodes
 
         # check horizontally for the same value
         for x in range(self.width):
-            if str(self.getBoardNode(x, node_y).value) == str(value):
-                if check_only_if_is_valid:
-                    return False
+            if self.values[node_y * self.width + x] == value:
                 output.append((x, node_y))
 
         # check vertically for the same value
         for y in range(self.height):
-            if str(self.getBoardNode(node_x, y).value) == str(value):
+            if self.values[y * self.width + node_x] == value:
                 if (node_x, y) not in output:
-                    if check_only_if_is_valid:
-                        return False
                     output.append((node_x, y))
 
-        # check squares
-        # base square index => startRow, startCol
-        startRow = node_x - node_x % 3
-        startCol = node_y - node_y % 3
-
-        for x in range(3):
-            for y in range(3):
-                if str(self.getBoardNode(x + startRow, y + startCol).value) == str(value):
-                    if (x + startRow, y + startCol) not in output:
-                        output.append((x + startRow, y + startCol))
-                        if check_only_if_is_valid:
-                            return False
+        # check squares (or jigsaw regions) and the extra units
+        for cells in [self.box_cells[box]] + [self.extra_units[unit] for unit in extraUnits]:
+            for cell in cells:
+                if self.values[cell] == value:
+                    if (cell % self.width, cell // self.width) not in output:
+                        output.append((cell % self.width, cell // self.width))
 
-        if check_only_if_is_valid:
-            return True
         return output
 
+    def fitsCageSums(self, index, value):
+        # the value keeps every killer cage of the node able to reach its sum
+        oldValue = self.values[index]
+        for unit in self.extra_units_of[index]:
+            total = self.extra_totals[unit]
+            if total:
+                newSum = self.extra_sums[unit] - oldValue + value
+                empty = len(self.extra_units[unit]) - self.extra_filled[unit] - (0 if oldValue else 1)
+
+                # the smallest and the biggest sum the empty nodes of the cage can add
+                if newSum + empty * (empty + 1) // 2 > total or \
+                        newSum + empty * (2 * self.width - empty + 1) // 2 < total:
+                    return False
+        return True
 
+    def getCandidatesMask(self, x, y):
+        # bitmask of the values that can be placed on this node without a conflict,
+        # the node's own value doesn't block itself
+        index = y * self.width + x
+        box = self.box_of[index]
+        rowMask, colMask, boxMask = self.row_masks[y], self.col_masks[x], self.box_masks[box]
+
+        value = self.values[index]
+        bit = 1 << value
+        if value:
+            if self.row_counts[y][value] == 1:
+                rowMask &= ~bit
+            if self.col_counts[x][value] == 1:
+                colMask &= ~bit
+            if self.box_counts[box][value] == 1:
+                boxMask &= ~bit
+
+        used = rowMask | colMask | boxMask
+        for unit in self.extra_units_of[index]:
+            unitMask = self.extra_masks[unit]
+            if value and self.extra_counts[unit][value] == 1:
+                unitMask &= ~bit
+            used |= unitMask
+
+        return ~used & self.all_values
+
+    def getCandidates(self, x, y):
+        mask = self.getCandidatesMask(x, y)
+        return [value for value in range(1, self.width + 1) if mask & (1 << value)]
 
     def printBoard(self):
 
@@ -153,118 +367,303 @@ class Board:
         return self.board[y][x]
 
     def setValue(self, x, y, value):
-        self
-        self.getBoardNode(x, y).value = value
-
-    def randomSolution(self, index):
-        pass
-
-    def getNodesWithoutValue(self):
-        # get all nodes that have value zero
-
-        nodesWithoutValue = []
-        for y in range(self.height):
-            for x in range(self.width):
-                if str(self.getBoardNode(x, y).value) == "0":
-                    nodesWithoutValue.append(self.getBoardNode(x, y))
-
-        return nodesWithoutValue
-
-
-
-    def generatePuzzle(self, maxSearchDepth=100_000):
-        nodes = self.getNodesWithoutValue()
-        lastP = 0
-
-        while nodes:
-
-            # get random node
-            randomIndex = random.randint(0, len(nodes) - 1)
-            x, y = nodes[randomIndex].x, nodes[randomIndex].y
-
-            # get all valid values for this node
-            validNumList = [num for num in range(1, 10) if len(self.isNodeValid(nodes[randomIndex], num)) == 0]
-
-            # set the node to a random value for all valid values
-            self.setValue(x, y, validNumList[random.randint(0, len(validNumList) - 1)])
-
-            # if the board doesn't have a solution, because of the new value => reset
-            # numberOfSolutions = self.backTrackingWithoutRecursion(1, False, maxSearchDepth)
-            numberOfSolutions = self.backTrackingWithoutRecursion(1, True, maxSearchDepth)
-
-            # returns -1 if the algorithm searches through 10 000 000 loops without result
-            # this puzzle is too costly to generate
-            if numberOfSolutions == -1:
-                print("\n\n\n ATTENTION: Search has been restarted, current search is too costly \n\n\n")
-                return False
-
-            # return 0 if the puzzle has no solution
-            if numberOfSolutions == 0:
-                self.setValue(x, y, 0)
-
+        # value is an int, every save and puzzle source yields ints
+        index = y * self.width + x
+        oldValue = self.values[index]
+        if oldValue == value:
+            return
+
+        box, extraUnits = self.node_units[index]
+
+        # remove the old value from the indexes
+        if oldValue:
+            bit = 1 << oldValue
+            rowCounts, colCounts, boxCounts = self.row_counts[y], self.col_counts[x], self.box_counts[box]
+
+            rowCounts[oldValue] -= 1
+            if rowCounts[oldValue] == 0:
+                self.row_masks[y] &= ~bit
+            elif rowCounts[oldValue] == 1:
+                self.conflict_count -= 1
+
+            colCounts[oldValue] -= 1
+            if colCounts[oldValue] == 0:
+                self.col_masks[x] &= ~bit
+            elif colCounts[oldValue] == 1:
+                self.conflict_count -= 1
+
+            boxCounts[oldValue] -= 1
+            if boxCounts[oldValue] == 0:
+                self.box_masks[box] &= ~bit
+            elif boxCounts[oldValue] == 1:
+                self.conflict_count -= 1
+        else:
+            self.empty_count -= 1
+
+        # add the new value to the indexes
+        if value:
+            bit = 1 << value
+            rowCounts, colCounts, boxCounts = self.row_counts[y], self.col_counts[x], self.box_counts[box]
+
+            rowCounts[value] += 1
+            self.row_masks[y] |= bit
+            colCounts[value] += 1
+            self.col_masks[x] |= bit
+            boxCounts[value] += 1
+            self.box_masks[box] |= bit
+
+            # a second equal value in a unit is a new conflict
+            if rowCounts[value] == 2:
+                self.conflict_count += 1
+            if colCounts[value] == 2:
+                self.conflict_count += 1
+            if boxCounts[value] == 2:
+                self.conflict_count += 1
+        else:
+            self.empty_count += 1
+
+        if extraUnits:
+            self.setExtraValue(extraUnits, oldValue, value)
+
+        self.values[index] = value
+
+        if self.auto_notes:
+            self.updateCandidates(index, oldValue, value)
+
+    def setAutoNotes(self, enabled=True):
+        # candidates of every empty node as bitmasks, computed once here and then only updated
+        # for the peers of the nodes setValue changes
+        self.auto_notes = enabled
+        if not enabled:
+            self.candidate_masks, self.peers = None, []
+            return
+
+        self.peers = getTables(self.box_size, self.variant).peers
+        self.candidate_masks = array(self.notes_type, [0] * (self.width * self.height))
+        for index, value in enumerate(self.values):
+            if not value:
+                self.candidate_masks[index] = self.getCandidatesMask(index % self.width, index // self.width)
+
+    def updateCandidates(self, index, oldValue, value):
+        # only the bits of the old and the new value change and only on the node and its peers
+        masks = self.candidate_masks
+        values = self.values
+        width = self.width
+        peers = self.peers[index]
+
+        if oldValue:
+            # the old value comes back on the empty peers where no other node of their units holds it
+            bit = 1 << oldValue
+            for peer in peers:
+                if not values[peer]:
+                    box, extraUnits = self.node_units[peer]
+                    used = self.row_masks[peer // width] | self.col_masks[peer % width] | self.box_masks[box]
+                    for unit in extraUnits:
+                        used |= self.extra_masks[unit]
+                    if not used & bit:
+                        masks[peer] |= bit
+
+        if value:
+            # a placed value => the peers lose it as a candidate
+            masks[index] = 0
+            bit = ~(1 << value)
+            for peer in peers:
+                masks[peer] &= bit
+        else:
+            masks[index] = self.getCandidatesMask(index % width, index // width)
+
+    def setExtraValue(self, units, oldValue, value):
+        # the same as setValue for the diagonals and cages of a node
+        for unit in units:
+            counts = self.extra_counts[unit]
+            if oldValue:
+                counts[oldValue] -= 1
+                if counts[oldValue] == 0:
+                    self.extra_masks[unit] &= ~(1 << oldValue)
+                elif counts[oldValue] == 1:
+                    self.conflict_count -= 1
+                self.extra_filled[unit] -= 1
+
+            if value:
+                counts[value] += 1
+                self.extra_masks[unit] |= 1 << value
+                if counts[value] == 2:
+                    self.conflict_count += 1
+                self.extra_filled[unit] += 1
+
+            self.extra_sums[unit] += value - oldValue
+
+    def isComplete(self):
+        # every node has a value
+        return self.empty_count == 0
+
+    def isSolved(self):
+        return self.empty_count == 0 and self.conflict_count == 0 and \
+            all(self.extra_sums[unit] == total for unit, total in enumerate(self.extra_totals) if total)
+
+    def isNodeConflicting(self, x, y):
+        # the node's value is used by another node in the same row, column, box or extra unit,
+        # or a killer cage of the node can't reach its sum anymore
+        index = y * self.width + x
+        value = self.values[index]
+        if value == 0:
+            return False
+        if self.row_counts[y][value] > 1 or self.col_counts[x][value] > 1 or \
+                self.box_counts[self.box_of[index]][value] > 1:
+            return True
+        return any(self.extra_counts[unit][value] > 1 for unit in self.extra_units_of[index]) or \
+            not self.fitsCageSums(index, value)
+
+    def getSolution(self):
+        # the solution of the givens, searched once per puzzle (a generated puzzle and the new games
+        # of the game come with theirs), None when the givens don't have exactly one solution
+        if self.solution is None:
+            givens = [value if given else 0 for value, given in zip(self.values, self.givens)]
+            form = canonicalForm(givens) if self.variant.kind == "classic" else None
+            cached = solutionCache.get(form, target_solutions=2)
+            if cached:
+                count, solution = cached
             else:
-                # the node has been successfully generated
-                nodes.pop(randomIndex)
-
-            # console
-            p = len(nodes)
+                engine = PropagationSolver(givens, 2, variant=self.variant)
+                count = engine.solve()
+                solution = engine.solutions[0] if engine.solutions else None
+                solutionCache.put(form, count, solution, target_solutions=2)
+            self.solution = tuple(solution) if count == 1 else ()
+        return self.solution or None
+
+    def isMistake(self, x, y):
+        # the node has a value that isn't the one of the solution, only checked once the solution is known
+        value = self.values[y * self.width + x]
+        return bool(value and self.solution and value != self.solution[y * self.width + x])
+
+    def revealValue(self, x, y):
+        # hint => the value of the solution on the node, returns False for givens and without a solution
+        index = y * self.width + x
+        if self.givens[index] or not self.getSolution():
+            return False
+        self.setValue(x, y, self.solution[index])
+        return True
 
-            p = int(50 - 50 * p / 81)
-            if p != lastP:
-                print(f"Loading: {p} %")
-                lastP = p
+    def showSolution(self):
+        # every node that isn't a given gets its value of the solution, returns False without a solution
+        if not self.getSolution():
+            return False
+        for index, value in enumerate(self.solution):
+            if not self.givens[index]:
+                self.setValue(index % self.width, index // self.width, value)
+        return True
 
-        # a valid random board has been generated
+    def getNotesMask(self, x, y):
+        return self.notes[y * self.width + x]
 
-        # add all nodes cords to a list
-        allNodesList = []
-        for x in range(self.width):
-            for y in range(self.height):
-                allNodesList.append((x, y))
+    def getShownNotesMask(self, x, y):
+        # the candidates with auto notes, the notes of the player otherwise
+        if self.auto_notes:
+            return self.candidate_masks[y * self.width + x]
+        return self.notes[y * self.width + x]
 
-        # shuffle allNodesList randomly
-        randomNodeList = []
-        while allNodesList:
-            randomNodeList.append(allNodesList.pop(random.randint(0, len(allNodesList) - 1)))
+    def toggleNote(self, x, y, value):
+        self.notes[y * self.width + x] ^= 1 << int(value)
 
-        # try to remove as many nodes as possible while maintaining the puzzle uniqueness
-        # (the puzzle has to have only one solution)
-        while randomNodeList:
-            x, y = randomNodeList.pop(0)
+    def clearNotes(self, x, y):
+        self.notes[y * self.width + x] = 0
 
-            # save node value in case the uniqueness of the puzzle breaks down once this node is removed
-            value = self.getBoardNode(x, y).value
+    def randomSolution(self, index):
+        pass
 
-            # remove node value
-            self.setValue(x, y, 0)
+    def getNodesWithoutValue(self):
+        # get all nodes that have value zero
 
-            # console output
-            p = len(randomNodeList)
-            if p == 0:
-                p = 1
+        nodesWithoutValue = []
+        for index, value in enumerate(self.values):
+            if value == 0:
+                nodesWithoutValue.append(self.getBoardNode(index % self.width, index // self.width))
 
-            p = int(50 + 50 / p)
-            if p != lastP:
-                print(f"Loading: {p} %")
-                lastP = p
+        return nodesWithoutValue
 
-            # if the puzzle has two solution => set the node to its original value
-            if self.backTrackingWithoutRecursion(2, False, maxSearchDepth) == 2:
-                self.setValue(x, y, value)
 
-                # user cannot change this node its apart of the puzzle
-                self.getBoardNode(x, y).userCannotChange = True
 
+    def generatePuzzle(self, maxSearchDepth=None, rng=random, progress=None):
+        # progress is called with the finished fraction (0 to 1) while the puzzle is dug out
+        if maxSearchDepth is None:
+            maxSearchDepth = GENERATOR_SEARCH_NODES.get(self.box_size, 20)
+
+        # fill the whole board with one randomized solve, a jigsaw gets new random regions
+        # (until the regions can be filled) and a killer gets new cages of the filled board
+        variant = self.variant
+        cells = self.width * self.height
+        startTime = time.perf_counter()
+        fillAttempts = 0
+        while True:
+            fillAttempts += 1
+            if variant.kind == "jigsaw":
+                variant = variant._replace(regions=randomRegions(self.box_size, rng))
+            filler = PropagationSolver([0] * cells, target_solutions=1, rng=rng, max_nodes=10_000,
+                                       variant=variant._replace(cages=()))
+            if filler.solve() == 1:
+                break
+        solution = filler.solutions[0]
+        puzzle = solution[:]
+
+        if variant.kind == "killer":
+            variant = variant._replace(cages=randomCages(puzzle, self.box_size, rng))
+        fillTime = time.perf_counter()
+
+        # dig holes in random order while the puzzle keeps exactly one solution,
+        # a node that can't be removed stays on the board as part of the puzzle
+        order = list(range(cells))
+        rng.shuffle(order)
+        digNodes = 0
+        for done, cell in enumerate(order):
+            if progress is not None:
+                progress(done / cells)
+
+            value = puzzle[cell]
+            puzzle[cell] = 0
+
+            # the puzzle is still unique if there is no solution with another value on this node,
+            # the search stops at the first such solution and returns -1 after maxSearchDepth nodes
+            checker = PropagationSolver(puzzle, 1, exclude=((cell, value),), max_nodes=maxSearchDepth,
+                                        variant=variant)
+            if checker.solve() != 0:
+                puzzle[cell] = value
+            digNodes += checker.nodes
+        digTime = time.perf_counter()
+
+        # the solution of the new puzzle is known => solving it (or one that is the same up to symmetry) is a lookup
+        if variant.kind == "classic":
+            solutionCache.put(canonicalForm(puzzle), 1, solution, target_solutions=2)
+
+        self.setBoxSize(self.box_size, variant)
+        self.setBoardWithDefaultValues(puzzle)
+        self.solution = tuple(solution)
+
+        if Instrumentation.sink is not None:
+            Instrumentation.emit("generate", box_size=self.box_size, variant=variant.kind,
+                                 givens=cells - puzzle.count(0), fill_attempts=fillAttempts, fill_nodes=filler.nodes,
+                                 fill_seconds=fillTime - startTime, dig_nodes=digNodes,
+                                 dig_seconds=digTime - fillTime)
         return True
 
-    def setToRandomPreGeneratedBoard(self):
-        with open('preGeneratedSudokuBoards.csv', 'rt') as f:
-            reader = list(csv.reader(f, delimiter=','))
-            self.setBoardWithDefaultValues(reader[random.randint(0, sum(1 for _ in reader) - 1)])
-        pass
+    def setToRandomPreGeneratedBoard(self, difficulty=None, rng=random, transform=True):
+        # difficulty is an index of Grader.LEVELS, None picks any puzzle,
+        # with transform the puzzle is a random symmetry of the bank puzzle => the same difficulty
+        # but practically never the same puzzle twice
+        bank = getBank('preGeneratedSudokuBoards.csv')
+        if bank.cells != self.width * self.height or self.variant.kind != "classic":
+            self.setBoxSize(boxSizeOf(bank.cells))
+        if difficulty is None:
+            index = bank.randomIndex(rng)
+        else:
+            index = getRatings('preGeneratedSudokuBoards.csv').randomIndex(difficulty, rng)
+
+        puzzle = bank[index]
+        if transform:
+            puzzle = applyTransform(puzzle, randomTransform(self.box_size, rng))
+        self.setBoardWithDefaultValues(puzzle)
 
     def setToPreGeneratedBoard(self, index):
-        with open('preGeneratedSudokuBoards.csv', 'rt') as f:
-            reader = list(csv.reader(f, delimiter=','))
-            self.setBoardWithDefaultValues(reader[index])
-            
+        bank = getBank('preGeneratedSudokuBoards.csv')
+        if bank.cells != self.width * self.height or self.variant.kind != "classic":
+            self.setBoxSize(boxSizeOf(bank.cells))
+        self.setBoardWithDefaultValues(bank[index])
@@ -0,0 +1,116 @@
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from DancingLinks import DancingLinks
+from Propagation import PropagationSolver
+
+ENGINES = {
+    "propagation": PropagationSolver,
+    "dlx": DancingLinks,
+}
+
+# puzzles solved by one worker task
+CHUNK_SIZE = 256
+
+
+def solveChunk(lines, solverType="propagation"):
+    # solve a list of csv lines, returns (solution, seconds, nodes) for every line,
+    # puzzles without a solution get a row of zeros
+    engine = ENGINES[solverType]
+    results = []
+    for line in lines:
+        startTime = time.perf_counter()
+        solver = engine([int(value) for value in line], target_solutions=1)
+        solver.solve()
+        seconds = time.perf_counter() - startTime
+
+        solution = solver.solutions[0] if solver.solutions else [0] * len(line)
+        results.append((solution, seconds, solver.nodes))
+    return results
+
+
+def readChunks(f, chunkSize):
+    # lazily split the puzzle file into chunks of csv lines
+    reader = (line for line in csv.reader(f, delimiter=',') if line)
+    while True:
+        chunk = list(islice(reader, chunkSize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def solveFile(inputPath='preGeneratedSudokuBoards.csv', outputPath='preSolvedSudokuBoards.csv',
+              workers=None, solverType="propagation", chunkSize=CHUNK_SIZE, timingPath=None):
+    # solve every puzzle of inputPath on a process pool and write the solutions
+    # to outputPath in input order, only a few chunks are held in memory at once
+    workers = workers or os.cpu_count() or 1
+
+    solved = unsolved = 0
+    totalSolveTime = 0.0
+    slowest = (0.0, -1)
+    startTime = time.perf_counter()
+
+    timingFile = open(timingPath, 'w', newline='') if timingPath else None
+    timingWriter = csv.writer(timingFile) if timingFile else None
+    if timingWriter:
+        timingWriter.writerow(["index", "seconds", "nodes"])
+
+    try:
+        with open(inputPath, 'rt') as inputFile, open(outputPath, 'w', newline='') as outputFile, \
+                ProcessPoolExecutor(workers) as executor:
+            writer = csv.writer(outputFile)
+            chunks = readChunks(inputFile, chunkSize)
+            pending = deque()
+            index = 0
+
+            while True:
+                # keep a bounded number of chunks in flight
+                for chunk in islice(chunks, workers * 2 - len(pending)):
+                    pending.append(executor.submit(solveChunk, chunk, solverType))
+                if not pending:
+                    break
+
+                for solution, seconds, nodes in pending.popleft().result():
+                    writer.writerow(solution)
+                    if timingWriter:
+                        timingWriter.writerow([index, f"{seconds:.6f}", nodes])
+
+                    if any(solution):
+                        solved += 1
+                    else:
+                        unsolved += 1
+                    totalSolveTime += seconds
+                    slowest = max(slowest, (seconds, index))
+                    index += 1
+
+                elapsed = time.perf_counter() - startTime
+                print(f"{index} puzzles, {index / elapsed:.1f} puzzles/s")
+    finally:
+        if timingFile:
+            timingFile.close()
+
+    elapsed = time.perf_counter() - startTime
+    total = solved + unsolved
+    print(f"solved {solved}/{total} puzzles in {elapsed:.2f} s => {total / max(elapsed, 1e-9):.1f} puzzles/s")
+    if total:
+        print(f"average solve time {totalSolveTime / total * 1000:.3f} ms, "
+              f"slowest puzzle {slowest[1]} with {slowest[0] * 1000:.3f} ms")
+    return solved, unsolved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve a csv file of sudoku puzzles on all cores.")
+    parser.add_argument("inputPath", nargs='?', default='preGeneratedSudokuBoards.csv')
+    parser.add_argument("outputPath", nargs='?', default='preSolvedSudokuBoards.csv')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--solver", choices=sorted(ENGINES), default="propagation")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--timing", default=None, help="csv file for the per-puzzle timing")
+    args = parser.parse_args()
+
+    solveFile(args.inputPath, args.outputPath, args.workers, args.solver, args.chunk_size, args.timing)
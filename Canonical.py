@@ -0,0 +1,209 @@
+import csv
+import os
+import random
+from collections import OrderedDict
+from itertools import groupby, permutations, product
+from math import factorial, prod
+from typing import NamedTuple, Tuple
+
+from Propagation import boxSizeOf
+from PuzzleBank import formatPuzzle, parsePuzzle
+
+# arrangements of rows and columns compared for one puzzle, puzzles with more ties than this
+# (almost full grids) have no canonical form and aren't cached
+MAX_ARRANGEMENTS = 5_000
+
+# puzzles kept by the solution cache
+MAX_CACHED = 10_000
+
+
+class Transform(NamedTuple):
+    # canonical value of the cell (y, x) = labels[value of the cell (rows[y], cols[x])] of the puzzle,
+    # which is transposed first when transposed is set
+    transposed: bool
+    rows: Tuple[int, ...]
+    cols: Tuple[int, ...]
+    labels: Tuple[int, ...]
+
+
+class CanonicalForm(NamedTuple):
+    puzzle: Tuple[int, ...]
+    transform: Transform
+
+
+def _orders(items, key):
+    # every order of items that is sorted by key, items with the same key can be in any order,
+    # None when there are more than MAX_ARRANGEMENTS
+    groups = [list(group) for _, group in groupby(sorted(items, key=key), key=key)]
+    if prod(factorial(len(group)) for group in groups) > MAX_ARRANGEMENTS:
+        return None
+    return [sum(choice, ()) for choice in product(*(permutations(group) for group in groups))]
+
+
+def _lineOrders(grid, boxSize):
+    # orders of the rows of grid that keep the bands together and sort them by the number of givens,
+    # the number of givens of a row and of its boxes doesn't change with the order of columns or digits
+    size = boxSize * boxSize
+    rowKeys = []
+    for row in grid:
+        boxCounts = [boxSize - row[stack:stack + boxSize].count(0) for stack in range(0, size, boxSize)]
+        rowKeys.append((sum(boxCounts), tuple(sorted(boxCounts))))
+    bands = [tuple(range(band, band + boxSize)) for band in range(0, size, boxSize)]
+    bandKeys = {band: tuple(sorted(rowKeys[row] for row in band)) for band in bands}
+
+    bandOrders = _orders(bands, bandKeys.__getitem__)
+    bandRows = {band: _orders(band, rowKeys.__getitem__) for band in bands}
+    if bandOrders is None or None in bandRows.values() or \
+            len(bandOrders) * prod(len(rows) for rows in bandRows.values()) > MAX_ARRANGEMENTS:
+        return None
+    return [sum(rows, ()) for bandOrder in bandOrders for rows in product(*(bandRows[band] for band in bandOrder))]
+
+
+def canonicalForm(values):
+    # the smallest puzzle (row by row) of every puzzle that is the same up to relabeling the digits,
+    # reordering bands, stacks, the rows of a band and the columns of a stack and transposing,
+    # None when the puzzle has too many equivalent arrangements
+    boxSize = boxSizeOf(len(values))
+    size = boxSize * boxSize
+    grid = [list(values[y * size:(y + 1) * size]) for y in range(size)]
+
+    # the rows of the transposed grid are the columns of the grid and the other way around
+    columns = [list(col) for col in zip(*grid)]
+    rowOrders, colOrders = _lineOrders(grid, boxSize), _lineOrders(columns, boxSize)
+    if rowOrders is None or colOrders is None or 2 * len(rowOrders) * len(colOrders) > MAX_ARRANGEMENTS:
+        return None
+    candidates = [(False, grid, rowOrders, colOrders), (True, columns, colOrders, rowOrders)]
+
+    best = bestRows = None
+    for transposed, rows, rowOrders, colOrders in candidates:
+        for rowOrder in rowOrders:
+            arranged = [rows[y] for y in rowOrder]
+            for colOrder in colOrders:
+                # digits are numbered in the order they first appear, the arrangement is dropped
+                # at the first row that is bigger than the row of the best one
+                labels = {0: 0}
+                puzzleRows = []
+                smaller = bestRows is None
+                for y, row in enumerate(arranged):
+                    line = [labels.setdefault(row[x], len(labels)) for x in colOrder]
+                    if not smaller:
+                        if line > bestRows[y]:
+                            break
+                        smaller = line < bestRows[y]
+                    puzzleRows.append(line)
+                else:
+                    if smaller:
+                        bestRows = puzzleRows
+                        best = (transposed, rowOrder, colOrder, labels)
+
+    transposed, rowOrder, colOrder, labels = best
+    puzzle = tuple(value for row in bestRows for value in row)
+    # digits that aren't in the puzzle get the remaining labels in order
+    for value in range(1, size + 1):
+        labels.setdefault(value, len(labels))
+    return CanonicalForm(puzzle, Transform(transposed, rowOrder, colOrder,
+                                           tuple(labels[value] for value in range(size + 1))))
+
+
+def randomTransform(boxSize=3, rng=random):
+    # one of the 2 * 6^8 * 9! (about 1.2 trillion for 9x9) symmetries of the sudoku, picked with rng
+    size = boxSize * boxSize
+
+    def lines():
+        return tuple(block * boxSize + line for block in rng.sample(range(boxSize), boxSize)
+                     for line in rng.sample(range(boxSize), boxSize))
+
+    return Transform(rng.random() < 0.5, lines(), lines(), (0,) + tuple(rng.sample(range(1, size + 1), size)))
+
+
+def applyTransform(values, transform):
+    # values rearranged and relabeled by transform, a puzzle (or its solution) in the canonical
+    # arrangement for the transform of its canonical form
+    size = len(transform.rows)
+    if transform.transposed:
+        return [transform.labels[values[x * size + y]] for y in transform.rows for x in transform.cols]
+    return [transform.labels[values[y * size + x]] for y in transform.rows for x in transform.cols]
+
+
+def revertTransform(values, transform):
+    # inverse of applyTransform => the values that transform turns into values
+    size = len(transform.rows)
+    digits = [0] * len(transform.labels)
+    for value, label in enumerate(transform.labels):
+        digits[label] = value
+
+    result = [0] * (size * size)
+    for y, row in enumerate(transform.rows):
+        for x, col in enumerate(transform.cols):
+            index = col * size + row if transform.transposed else row * size + col
+            result[index] = digits[values[y * size + x]]
+    return result
+
+
+class SolutionCache:
+    """
+    Bounded LRU map of canonical puzzles to their number of solutions and a solution, optionally kept in a file.
+    """
+
+    def __init__(self, maxsize=MAX_CACHED, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        # canonical puzzle => (number of solutions, whether that is all of them, canonical solution)
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, form, target_solutions=1):
+        # (number of solutions up to target_solutions, a solution or None) of the puzzle or None
+        # when it isn't cached (or only with fewer solutions than it takes to answer)
+        entry = self.entries.get(form.puzzle) if form else None
+        if entry is not None:
+            count, complete, solution = entry
+            if complete or 0 < target_solutions <= count:
+                self.entries.move_to_end(form.puzzle)
+                self.hits += 1
+                count = min(count, target_solutions) if target_solutions > 0 else count
+                return count, revertTransform(solution, form.transform) if solution else None
+        self.misses += 1
+        return None
+
+    def put(self, form, count, solution=None, target_solutions=1):
+        # count is the number of solutions a search for target_solutions (0 => all of them) found
+        if not form:
+            return
+        complete = target_solutions <= 0 or count < target_solutions
+        old = self.entries.get(form.puzzle)
+        if old is not None and (old[1] or old[0] >= count):
+            return
+
+        self.entries[form.puzzle] = (count, complete, tuple(applyTransform(solution, form.transform)) if solution else None)
+        self.entries.move_to_end(form.puzzle)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def load(self, path=None):
+        # every line is the canonical puzzle, the number of solutions, 1 when it is all of them and the solution
+        with open(path or self.path, 'rt') as f:
+            for puzzle, count, complete, solution in csv.reader(f, delimiter=','):
+                self.entries[tuple(parsePuzzle(puzzle))] = (int(count), complete == "1",
+                                                            tuple(parsePuzzle(solution)) if solution else None)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def save(self, path=None):
+        path = path or self.path
+        tmpPath = path + ".tmp"
+        with open(tmpPath, 'w', newline='') as f:
+            writer = csv.writer(f)
+            for puzzle, (count, complete, solution) in self.entries.items():
+                writer.writerow([formatPuzzle(puzzle), count, int(complete), formatPuzzle(solution) if solution else ""])
+        os.replace(tmpPath, path)
+
+
+# the cache used by Solver and Board.generatePuzzle
+solutionCache = SolutionCache()
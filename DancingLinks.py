@@ -0,0 +1,198 @@
+from functools import lru_cache
+from typing import List
+
+from Propagation import _SearchLimitReached, boxSizeOf
+from Variants import Variant
+
+# sudoku as an exact cover problem, for a classic 9x9:
+# columns: 81 cell constraints, 81 row-value, 81 column-value and 81 box-value constraints
+# rows: every (cell, value) pair, each row covers exactly 4 columns (one more for every diagonal of the cell)
+
+
+@lru_cache(maxsize=8)
+def _buildTemplate(variant):
+    # build the full matrix (729 x 324 for a classic 9x9) once as arrays of links, node 0 is the root,
+    # nodes 1..number of columns are the column headers and the remaining nodes are the matrix entries
+    width = variant.boxSize * variant.boxSize
+    cells = width * width
+    units = variant.units()
+    numberOfColumns = cells + len(units) * width
+
+    # the units of every cell => its columns are the cell constraint and a unit-value constraint per unit
+    unitsOf = [[] for _ in range(cells)]
+    for unitIndex, unit in enumerate(units):
+        for cell in unit:
+            unitsOf[cell].append(unitIndex)
+
+    left = [numberOfColumns] + list(range(numberOfColumns))
+    right = list(range(1, numberOfColumns + 1)) + [0]
+    up = list(range(numberOfColumns + 1))
+    down = list(range(numberOfColumns + 1))
+    column = list(range(numberOfColumns + 1))
+    size = [0] * (numberOfColumns + 1)
+    rowOf = [-1] * (numberOfColumns + 1)
+    rowStart = []
+
+    for cell in range(cells):
+        for value in range(1, width + 1):
+            row = cell * width + value - 1
+            columns = [1 + cell] + [1 + cells + unitIndex * width + value - 1 for unitIndex in unitsOf[cell]]
+
+            first = len(left)
+            rowStart.append(first)
+            for offset, header in enumerate(columns):
+                node = first + offset
+                left.append(first + (offset - 1) % len(columns))
+                right.append(first + (offset + 1) % len(columns))
+
+                # append the node at the bottom of its column
+                up.append(up[header])
+                down.append(header)
+                down[up[header]] = node
+                up[header] = node
+
+                column.append(header)
+                size[header] += 1
+                rowOf.append(row)
+
+    return left, right, up, down, column, size, rowOf, rowStart
+
+
+_buildTemplate(Variant())
+
+
+class DancingLinks:
+    """
+    Solves or counts the solutions of a flat list of size * size values (0 = empty, 81 for 9x9)
+    with Knuth's Algorithm X on dancing links.
+    variant adds the rules of a diagonal or jigsaw sudoku (see Variants.Variant),
+    killer cage sums are no exact cover constraint => use PropagationSolver for them.
+    With max_nodes set, the search gives up after that many nodes and solve returns -1.
+    """
+
+    def __init__(self, values, target_solutions=1, variant=None, max_nodes=0):
+        self.values = [int(value) for value in values]
+        self.box_size = boxSizeOf(len(self.values))
+        self.variant = variant or Variant(boxSize=self.box_size)
+        if self.variant.cages:
+            raise ValueError("dancing links can't solve killer cages, use the propagation solver")
+        self.target_solutions = target_solutions
+        self.max_nodes = max_nodes
+
+        self.solutions: List[List[int]] = []
+        self.number_of_solutions = 0
+        self.nodes = 0
+        self.backtracks = 0
+
+    def solve(self):
+        left, right, up, down, column, size, rowOf, rowStart = (list(links) for links in _buildTemplate(self.variant))
+        width = self.box_size * self.box_size
+        cells = width * width
+        self.solutions = []
+        self.number_of_solutions = 0
+        self.nodes = 0
+        self.backtracks = 0
+
+        def cover(header):
+            right[left[header]] = right[header]
+            left[right[header]] = left[header]
+            i = down[header]
+            while i != header:
+                j = right[i]
+                while j != i:
+                    up[down[j]] = up[j]
+                    down[up[j]] = down[j]
+                    size[column[j]] -= 1
+                    j = right[j]
+                i = down[i]
+
+        def uncover(header):
+            i = up[header]
+            while i != header:
+                j = left[i]
+                while j != i:
+                    size[column[j]] += 1
+                    up[down[j]] = j
+                    down[up[j]] = j
+                    j = left[j]
+                i = up[i]
+            right[left[header]] = header
+            left[right[header]] = header
+
+        # the givens are part of every solution => cover their rows up front
+        covered = [False] * len(size)
+        partial = []
+        for cell, value in enumerate(self.values):
+            if value:
+                first = node = rowStart[cell * width + value - 1]
+                while True:
+                    if covered[column[node]]:
+                        # two givens clash => no solution
+                        return 0
+                    covered[column[node]] = True
+                    cover(column[node])
+                    node = right[node]
+                    if node == first:
+                        break
+                partial.append(first)
+
+        def search():
+            # returns True once target_solutions solutions have been found
+            if right[0] == 0:
+                self.number_of_solutions += 1
+                solution = [0] * cells
+                for node in partial:
+                    cell, value = divmod(rowOf[node], width)
+                    solution[cell] = value + 1
+                self.solutions.append(solution)
+                return 0 < self.target_solutions <= self.number_of_solutions
+
+            # choose the column with the fewest rows left
+            header = right[0]
+            best, bestSize = header, size[header]
+            while header != 0 and bestSize > 1:
+                if size[header] < bestSize:
+                    best, bestSize = header, size[header]
+                header = right[header]
+
+            if bestSize == 0:
+                self.backtracks += 1
+                return False
+
+            cover(best)
+            row = down[best]
+            while row != best:
+                self.nodes += 1
+                if self.max_nodes and self.nodes > self.max_nodes:
+                    raise _SearchLimitReached
+                partial.append(row)
+                j = right[row]
+                while j != row:
+                    cover(column[j])
+                    j = right[j]
+
+                if search():
+                    return True
+
+                j = left[row]
+                while j != row:
+                    uncover(column[j])
+                    j = left[j]
+                partial.pop()
+                row = down[row]
+            uncover(best)
+
+            self.backtracks += 1
+            return False
+
+        try:
+            search()
+        except _SearchLimitReached:
+            return -1
+        return self.number_of_solutions
+
+
+def count_solutions(grid, limit=2):
+    # number of solutions of a flat grid (81 values for 9x9), the search stops once limit solutions are found
+    engine = DancingLinks(grid, target_solutions=limit)
+    return engine.solve()
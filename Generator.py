@@ -0,0 +1,101 @@
+import argparse
+import csv
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from Board import Board
+from Canonical import canonicalForm
+
+# puzzles generated by one worker task, big enough to keep the inter-process overhead low
+CHUNK_SIZE = 16
+
+
+def generateChunk(seed, chunkIndex, chunkSize=CHUNK_SIZE, maxSearchDepth=None, boxSize=3):
+    # every chunk has its own seed derived from the run seed => the same run seed
+    # produces the same puzzles no matter how many workers are used
+    rng = random.Random(f"{seed}:{chunkIndex}")
+    board = Board(boxSize)
+
+    puzzles = []
+    for _ in range(chunkSize):
+        board.generatePuzzle(maxSearchDepth, rng)
+        puzzles.append(board.getValuesDefault())
+    return puzzles
+
+
+def puzzleKey(puzzle):
+    # puzzles that are the same up to symmetry (relabeled digits, swapped rows or columns, transposed)
+    # have the same key, a puzzle without a canonical form is its own key
+    form = canonicalForm(puzzle)
+    return form.puzzle if form else tuple(puzzle)
+
+
+def readGeneratedBoards(path):
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, 'rt') as f:
+        return {puzzleKey([int(value) for value in line]) for line in csv.reader(f, delimiter=',') if line}
+
+
+def generateBoards(numberOfBoards, path='preGeneratedSudokuBoards.csv', workers=None, seed=None,
+                   chunkSize=CHUNK_SIZE, maxSearchDepth=None, boxSize=3):
+    # generate numberOfBoards new puzzles of (boxSize * boxSize) x (boxSize * boxSize) nodes on a process pool
+    # and append them to path, puzzles that are already in the file (up to symmetry) are skipped
+    if seed is None:
+        seed = random.SystemRandom().randrange(1 << 32)
+    workers = workers or os.cpu_count() or 1
+    print(f"generating {numberOfBoards} boards with {workers} workers, seed {seed}")
+
+    generatedBoards = readGeneratedBoards(path)
+    written = duplicates = 0
+    startTime = time.perf_counter()
+
+    with open(path, 'a', newline='', encoding='utf-8') as f, ProcessPoolExecutor(workers) as executor:
+        writer = csv.writer(f)
+
+        # keep a bounded number of chunks in flight and write them in submission order,
+        # so the output file is reproducible and memory stays flat for any numberOfBoards
+        pending = deque()
+        nextChunk = 0
+
+        while written < numberOfBoards:
+            while len(pending) < workers * 2 and written + len(pending) * chunkSize < numberOfBoards:
+                pending.append(executor.submit(generateChunk, seed, nextChunk, chunkSize, maxSearchDepth,
+                                               boxSize))
+                nextChunk += 1
+
+            for puzzle in pending.popleft().result():
+                key = puzzleKey(puzzle)
+                if key in generatedBoards:
+                    duplicates += 1
+                elif written < numberOfBoards:
+                    generatedBoards.add(key)
+                    writer.writerow(puzzle)
+                    written += 1
+            f.flush()
+
+            elapsed = time.perf_counter() - startTime
+            print(f"{written}/{numberOfBoards} boards, {written / elapsed:.1f} boards/s")
+
+        for future in pending:
+            future.cancel()
+
+    if duplicates:
+        print(f"skipped {duplicates} boards that were already generated")
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate unique sudoku puzzles on all cores.")
+    parser.add_argument("numberOfBoards", type=int)
+    parser.add_argument("--path", default='preGeneratedSudokuBoards.csv')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--box-size", type=int, default=3, help="3 => 9x9, 4 => 16x16, 5 => 25x25")
+    args = parser.parse_args()
+
+    generateBoards(args.numberOfBoards, args.path, args.workers, args.seed, boxSize=args.box_size)
@@ -0,0 +1,400 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+from array import array
+from collections import deque
+from typing import Dict, NamedTuple
+
+from Propagation import ALL_VALUES, CELLS, MASK_VALUES, POPCOUNT, UNITS, PropagationSolver
+from PuzzleBank import getBank
+
+LEVELS = ["easy", "medium", "hard", "expert"]
+
+# every technique with the level it belongs to and its weight in the score
+TECHNIQUES = {
+    "naked single": (0, 1),
+    "hidden single": (0, 2),
+    "locked candidates": (1, 10),
+    "naked pair": (1, 15),
+    "hidden pair": (1, 20),
+    "x-wing": (2, 40),
+    "search": (3, 100),
+}
+
+ROWS, COLUMNS, BOXES = UNITS[0:9], UNITS[9:18], UNITS[18:27]
+
+# box/line pairs that share more than one cell => used for locked candidates
+INTERSECTIONS = [(set(box), set(line)) for box in BOXES for line in ROWS + COLUMNS
+                 if len(set(box) & set(line)) > 1]
+
+# bit of every technique in the technique mask of a puzzle
+TECHNIQUE_BITS = {name: 1 << bit for bit, name in enumerate(TECHNIQUES)}
+
+# ratings file layout
+# header: magic, version, number of levels, number of puzzles
+# body: level of every puzzle (1 byte), score of every puzzle (2 bytes), the techniques it needed
+#       (1 byte, see TECHNIQUE_BITS), its search nodes (4 bytes),
+#       number of puzzles of every level (4 bytes) and the puzzle indices sorted by level (4 bytes)
+MAGIC = b"SDKR"
+VERSION = 2
+HEADER = struct.Struct("<4sBBI")
+
+
+class Grade(NamedTuple):
+    level: int
+    score: int
+    techniques: Dict[str, int]
+    searchNodes: int
+
+
+class Grader:
+    """
+    Solves a puzzle the way a human would, technique by technique from the easiest one,
+    and records which techniques were needed. Search is only used when all techniques are stuck.
+    """
+
+    def __init__(self, values):
+        if len(values) != CELLS:
+            raise ValueError("only 9x9 puzzles can be graded")
+
+        self.values = [0] * CELLS
+        self.candidates = [ALL_VALUES] * CELLS
+        self.techniques: Dict[str, int] = {}
+        self.searchNodes = 0
+
+        for cell, value in enumerate(values):
+            value = int(value)
+            if value and not self.place(cell, value):
+                raise ValueError("puzzle has conflicting givens")
+
+    def place(self, cell, value):
+        if not self.candidates[cell] & (1 << value):
+            return False
+        return PropagationSolver.place(self.values, self.candidates, cell, value)
+
+    def eliminate(self, cells, mask):
+        # remove the values of mask from the candidates of the empty cells, returns True on progress
+        progress = False
+        for cell in cells:
+            if not self.values[cell] and self.candidates[cell] & mask:
+                self.candidates[cell] &= ~mask
+                progress = True
+        return progress
+
+    def grade(self):
+        steps = (
+            ("naked single", self.nakedSingle),
+            ("hidden single", self.hiddenSingle),
+            ("locked candidates", self.lockedCandidates),
+            ("naked pair", self.nakedPair),
+            ("hidden pair", self.hiddenPair),
+            ("x-wing", self.xWing),
+        )
+
+        while 0 in self.values:
+            for name, step in steps:
+                if step():
+                    self.techniques[name] = self.techniques.get(name, 0) + 1
+                    break
+            else:
+                # no technique helps => the rest needs search
+                solver = PropagationSolver(self.values, target_solutions=1)
+                if solver.solve() != 1:
+                    raise ValueError("puzzle has no solution")
+                self.searchNodes = solver.nodes
+                self.techniques["search"] = 1
+                break
+
+            if any(not self.values[cell] and not self.candidates[cell] for cell in range(CELLS)):
+                raise ValueError("puzzle has no solution")
+
+        level = max((TECHNIQUES[name][0] for name in self.techniques), default=0)
+        score = sum(TECHNIQUES[name][1] * count for name, count in self.techniques.items()) + self.searchNodes
+        return Grade(level, min(score, 0xFFFF), self.techniques, self.searchNodes)
+
+    def nakedSingle(self):
+        for cell in range(CELLS):
+            if not self.values[cell] and POPCOUNT[self.candidates[cell]] == 1:
+                return self.place(cell, MASK_VALUES[self.candidates[cell]][0])
+        return False
+
+    def hiddenSingle(self):
+        for unit in UNITS:
+            once = twice = 0
+            for cell in unit:
+                twice |= once & self.candidates[cell]
+                once |= self.candidates[cell]
+
+            hidden = once & ~twice
+            for cell in unit:
+                if not self.values[cell] and self.candidates[cell] & hidden:
+                    return self.place(cell, MASK_VALUES[self.candidates[cell] & hidden][0])
+        return False
+
+    def lockedCandidates(self):
+        # a value that is limited to the intersection of a box and a line in one of them
+        # can be removed from the rest of the other one
+        for box, line in INTERSECTIONS:
+            intersection = box & line
+            for first, second in ((box, line), (line, box)):
+                outside = 0
+                for cell in first - intersection:
+                    if not self.values[cell]:
+                        outside |= self.candidates[cell]
+
+                inside = 0
+                for cell in intersection:
+                    if not self.values[cell]:
+                        inside |= self.candidates[cell]
+
+                locked = inside & ~outside
+                if locked and self.eliminate(second - intersection, locked):
+                    return True
+        return False
+
+    def nakedPair(self):
+        # two cells of a unit with the same two candidates => remove them from the rest of the unit
+        for unit in UNITS:
+            seen = {}
+            for cell in unit:
+                mask = self.candidates[cell]
+                if not self.values[cell] and POPCOUNT[mask] == 2:
+                    if mask in seen:
+                        others = [other for other in unit if other not in (cell, seen[mask])]
+                        if self.eliminate(others, mask):
+                            return True
+                    seen[mask] = cell
+        return False
+
+    def hiddenPair(self):
+        # two values that fit only the same two cells of a unit => those cells can't hold anything else
+        for unit in UNITS:
+            places = {}
+            for value in range(1, 10):
+                bit = 1 << value
+                cells = tuple(cell for cell in unit if not self.values[cell] and self.candidates[cell] & bit)
+                if len(cells) == 2:
+                    places.setdefault(cells, []).append(bit)
+
+            for cells, bits in places.items():
+                if len(bits) == 2:
+                    pair = bits[0] | bits[1]
+                    if self.eliminate(cells, ~pair & ALL_VALUES):
+                        return True
+        return False
+
+    def xWing(self):
+        # a value that fits only the same two columns of two rows can be removed
+        # from the rest of those columns (and the same with rows and columns swapped)
+        for baseUnits, coverUnits in ((ROWS, COLUMNS), (COLUMNS, ROWS)):
+            for value in range(1, 10):
+                bit = 1 << value
+                positions = {}
+                for base, unit in enumerate(baseUnits):
+                    where = tuple(index for index, cell in enumerate(unit)
+                                  if not self.values[cell] and self.candidates[cell] & bit)
+                    if len(where) == 2:
+                        positions.setdefault(where, []).append(base)
+
+                for where, bases in positions.items():
+                    if len(bases) == 2:
+                        for index in where:
+                            others = [cell for base, cell in enumerate(coverUnits[index]) if base not in bases]
+                            if self.eliminate(others, bit):
+                                return True
+        return False
+
+
+def grade(values):
+    return Grader(values).grade()
+
+
+def techniqueMask(techniques):
+    mask = 0
+    for name in techniques:
+        mask |= TECHNIQUE_BITS[name]
+    return mask
+
+
+def gradeChunk(puzzles):
+    # (level, score, technique mask, search nodes) of every puzzle
+    results = []
+    for puzzle in puzzles:
+        level, score, techniques, searchNodes = grade(puzzle)
+        results.append((level, score, techniqueMask(techniques), min(searchNodes, 0xFFFFFFFF)))
+    return results
+
+
+def ratingsPath(bankPath):
+    return os.path.splitext(bankPath)[0] + ".ratings"
+
+
+def gradeBank(bank, path, workers=None, chunkSize=64, progress=None):
+    # grade every puzzle of the bank on a process pool and write the ratings file,
+    # progress is called with the graded fraction (0 to 1) after every chunk
+    workers = workers or os.cpu_count() or 1
+    levels = array('B', bytes(len(bank)))
+    scores = array('H', bytes(2 * len(bank)))
+    techniques = array('B', bytes(len(bank)))
+    searchNodes = array('I', bytes(4 * len(bank)))
+
+    # multiprocessing is only imported once a bank is graded => importing Board (and the cli) stays fast
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        chunks = iter(range(0, len(bank), chunkSize))
+        while True:
+            for start in chunks:
+                puzzles = [bank[index] for index in range(start, min(start + chunkSize, len(bank)))]
+                pending.append((start, executor.submit(gradeChunk, puzzles)))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+
+            start, future = pending.popleft()
+            for index, (level, score, mask, nodes) in enumerate(future.result(), start):
+                levels[index] = level
+                scores[index] = score
+                techniques[index] = mask
+                searchNodes[index] = nodes
+            if progress is not None:
+                progress(min(start + chunkSize, len(bank)) / len(bank))
+
+    # index of the puzzles by level
+    counts = array('I', [0] * len(LEVELS))
+    indices = array('I')
+    for level in range(len(LEVELS)):
+        levelIndices = [index for index, puzzleLevel in enumerate(levels) if puzzleLevel == level]
+        counts[level] = len(levelIndices)
+        indices.extend(levelIndices)
+
+    tmpPath = path + ".tmp"
+    with open(tmpPath, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(LEVELS), len(bank)))
+        f.write(levels.tobytes())
+        f.write(scores.tobytes())
+        f.write(techniques.tobytes())
+        f.write(searchNodes.tobytes())
+        f.write(counts.tobytes())
+        f.write(indices.tobytes())
+    os.replace(tmpPath, path)
+
+
+class Ratings:
+    """
+    Read-only, memory-mapped difficulty ratings of a puzzle bank.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, numberOfLevels, self.count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION or numberOfLevels != len(LEVELS):
+            self.mmap.close()
+            raise ValueError(f"{path} is not a ratings file")
+
+        self.levelsStart = HEADER.size
+        self.scoresStart = self.levelsStart + self.count
+        self.techniquesStart = self.scoresStart + 2 * self.count
+        self.searchNodesStart = self.techniquesStart + self.count
+        countsStart = self.searchNodesStart + 4 * self.count
+        self.counts = struct.unpack_from(f"<{len(LEVELS)}I", self.mmap, countsStart)
+
+        # where the indices of every level start
+        self.indicesStart = []
+        start = countsStart + 4 * len(LEVELS)
+        for count in self.counts:
+            self.indicesStart.append(start)
+            start += 4 * count
+
+    def level(self, index):
+        return self.mmap[self.levelsStart + index]
+
+    def score(self, index):
+        return struct.unpack_from("<H", self.mmap, self.scoresStart + 2 * index)[0]
+
+    def nearestLevel(self, level):
+        # the level itself when it has puzzles, otherwise the closest one that has (the harder one on a tie)
+        levels = [other for other, count in enumerate(self.counts) if count]
+        if not levels:
+            raise IndexError("there are no rated puzzles")
+        return min(levels, key=lambda other: (abs(other - level), -other))
+
+    def techniques(self, index):
+        # names of the techniques the puzzle needed
+        mask = self.mmap[self.techniquesStart + index]
+        return [name for name, bit in TECHNIQUE_BITS.items() if mask & bit]
+
+    def searchNodes(self, index):
+        # search nodes needed once the techniques were stuck, 0 => solved without search
+        return struct.unpack_from("<I", self.mmap, self.searchNodesStart + 4 * index)[0]
+
+    def randomIndex(self, level, rng=random):
+        # a puzzle of the level, or of the nearest level with puzzles => the technique levels of a bank
+        # don't have to cover every level
+        level = self.nearestLevel(level)
+        position = self.indicesStart[level] + 4 * rng.randrange(self.counts[level])
+        return struct.unpack_from("<I", self.mmap, position)[0]
+
+    def close(self):
+        self.mmap.close()
+
+
+# ratings that are already open, keyed by path
+_openRatings = {}
+
+
+def isGraded(bank, path):
+    # the ratings file is newer than the bank and of the current version
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(bank.path):
+        return False
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    return len(header) == HEADER.size and HEADER.unpack(header)[:2] == (MAGIC, VERSION)
+
+
+def getRatings(csvPath='preGeneratedSudokuBoards.csv', progress=None):
+    # open the ratings of the bank next to the csv file, they are (re)built when the bank is newer
+    bank = getBank(csvPath)
+    path = ratingsPath(bank.path)
+    if not isGraded(bank, path):
+        if path in _openRatings:
+            _openRatings.pop(path).close()
+        gradeBank(bank, path, progress=progress)
+
+    if path not in _openRatings:
+        _openRatings[path] = Ratings(path)
+    return _openRatings[path]
+
+
+def levelsWithPuzzles(csvPath='preGeneratedSudokuBoards.csv'):
+    # the levels that have puzzles in the bank, every level while it isn't graded yet
+    # (grading takes a while => it is left to the first game of a level, see Ratings.randomIndex)
+    bank = getBank(csvPath)
+    if not isGraded(bank, ratingsPath(bank.path)):
+        return list(range(len(LEVELS)))
+    return [level for level, count in enumerate(getRatings(csvPath).counts) if count]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Grade every puzzle of a puzzle bank.")
+    parser.add_argument("csvPath", nargs='?', default='preGeneratedSudokuBoards.csv')
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    bank = getBank(args.csvPath)
+    gradeBank(bank, ratingsPath(bank.path), args.workers)
+    ratings = getRatings(args.csvPath)
+    for level, count in enumerate(ratings.counts):
+        print(f"{LEVELS[level]}: {count} puzzles")
+    for name in TECHNIQUES:
+        needed = [index for index in range(ratings.count) if name in ratings.techniques(index)]
+        print(f"{name}: {len(needed)} puzzles")
+    searched = [ratings.searchNodes(index) for index in range(ratings.count) if ratings.searchNodes(index)]
+    if searched:
+        print(f"search nodes: {max(searched)} at most, {sum(searched) / len(searched):.1f} on average")
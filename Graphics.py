@@ -1,13 +1,18 @@
 import sys
-from os.path import exists
+import time
 import pygame
 import pygame_menu
 from pygame_menu.examples import create_example_window
+from Grader import LEVELS, levelsWithPuzzles
+from Jobs import Job, generateState, newGameState, solutionOf, solveState
+from SaveFile import SaveFile
 from Solver import Solver
+from Variants import KINDS, Variant
 
 pygame.init()
 FONT = pygame.font.Font(None, 32)
 NOTE_FONT = pygame.font.Font(None, 25)
+CAGE_FONT = pygame.font.Font(None, 16)
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 GREEN = (34, 139, 34)
@@ -16,6 +21,22 @@ RED = (255, 69, 0)
 BLUE = (0, 0, 255)
 BROWN = (255, 153, 51)
 DARK_GREEN = (51, 102, 0)
+LIGHT_BLUE = (225, 235, 255)
+
+# frames per second of the game loop
+FPS = 60
+
+# speeds of the solver animation => solver steps per frame, milliseconds of solving per frame
+# or instant (the whole solve in one frame), changed with + and -
+SOLVE_SPEEDS = [("steps", 1), ("steps", 10), ("steps", 100), ("ms", 4), ("ms", 12), ("instant", 0)]
+DEFAULT_SOLVE_SPEED = 2
+
+# symbols of the values 1, 2, ... => digits and then letters for boards bigger than 9x9
+SYMBOLS = "123456789ABCDEFGHIJKLMNOP"
+
+# pixel size of one square by box size
+SQUARE_SIZES = {2: 100, 3: 50, 4: 40, 5: 30}
+BOARD_SIZES = [("9x9", 3), ("4x4", 2), ("16x16", 4), ("25x25", 5)]
 
 
 class Graphics:
@@ -25,25 +46,39 @@ class Graphics:
         # following variables are used to showing how puzzle is being solved
         self.isSolving = False
         self.numberOfSolutions = 0
+        self.solveSpeed = DEFAULT_SOLVE_SPEED
+        self.solveSteps = 0
+        self.solveStartTime = 0.0
+        self.lastStatsTime = 0.0
         self.emptyNodes = None
         self.savedSolution = None
         self.currentIndex = 0
         self.lastNodeValues = None
-        self.invalidNodes = []
 
         # pixel width of line
         self.BOLD_LINE = 3
-        self.SQUARE_SIDE_SIZE = 50
-        self.BOARD_HEIGHT = self.BOARD_WIDTH = self.SQUARE_SIDE_SIZE * 9 + self.BOLD_LINE - 1
 
-        # pygame graphics tools
-        self.SCREEN = pygame.display.set_mode((self.BOARD_WIDTH, self.BOARD_HEIGHT))
+        # pre-rendered symbols, keyed by (font, symbol, color)
+        self.glyphs = {}
+
+        # fonts of the values and of the notes by box size
+        self.fonts = {3: (FONT, NOTE_FONT)}
+
+        # pygame graphics tools, the sizes depend on the board => set by setLayout
+        self.SQUARE_SIDE_SIZE = self.BOARD_HEIGHT = self.BOARD_WIDTH = 0
+        self.SCREEN = None
+        self.font, self.noteFont = FONT, NOTE_FONT
+        self.symbols = SYMBOLS[:self.board.width]
+        self.setLayout()
         self.CLOCK = pygame.time.Clock()
         self.CLOCK.tick(20)
         self.SCREEN.fill(WHITE)
 
         self.solver = None
 
+        # the board is saved after every key press, see SaveFile
+        self.saveFile = SaveFile()
+
         # selected node cords
         self.selectedX = None
         self.selectedY = None
@@ -59,87 +94,330 @@ class Graphics:
 
         self.addingNotes = False
 
+        # index of Grader.LEVELS used for new games, None => any puzzle
+        self.difficulty = None
+
+        # box size and variant kind of new games, 3 => 9x9
+        self.boxSize = self.board.box_size
+        self.variantKind = self.board.variant.kind
+
+        # killer cage of every node and the sum shown on the first node of every cage, set by showBoard
+        self.cageOf = []
+        self.cageSums = {}
+
+        # what is currently drawn in every cell, None => the whole board has to be redrawn
+        self.cellStates = None
+
+        # something could look different since the last frame (an event, a solver step or a job),
+        # False => the cells aren't compared and the frame draws nothing
+        self.changed = True
+
+        # solve, generate or grade running in a worker process, its result replaces the board
+        self.job = None
+
+    def setLayout(self):
+        # square size, window and fonts for the size of the board, called again when the board size changes
+        boxSize = self.board.box_size
+        self.SQUARE_SIDE_SIZE = SQUARE_SIZES.get(boxSize, 30)
+        self.BOARD_HEIGHT = self.BOARD_WIDTH = self.SQUARE_SIDE_SIZE * self.board.width + self.BOLD_LINE - 1
+        self.SCREEN = pygame.display.set_mode((self.BOARD_WIDTH, self.BOARD_HEIGHT))
+
+        if boxSize not in self.fonts:
+            self.fonts[boxSize] = (pygame.font.Font(None, self.SQUARE_SIDE_SIZE * 2 // 3),
+                                   pygame.font.Font(None, max(self.SQUARE_SIDE_SIZE * 4 // (3 * boxSize), 10)))
+        self.font, self.noteFont = self.fonts[boxSize]
+        self.symbols = SYMBOLS[:self.board.width]
+
+        for value in range(1, self.board.width + 1):
+            for color in (BLACK, BLUE, RED):
+                self.getGlyph(self.font, value, color)
+            self.getGlyph(self.noteFont, value, BROWN)
+
+        self.selectedX, self.selectedY = None, None
+        self.cellStates = None
+
     def isDoubleClick(self):
         self.timer += self.ADD_TO_TIMER
         return self.timer < 3
 
+    def advanceSolver(self):
+        # run as many solver steps as the speed setting allows in this frame
+        mode, amount = SOLVE_SPEEDS[self.solveSpeed]
+        if mode == "instant":
+            # the rest of the solve could take minutes => no more animation, the answer is shown at once
+            self.isSolving = False
+            self.showSolveStats(force=True)
+            self.showAnswer()
+            return
+
+        deadline = time.perf_counter() + amount / 1000
+        steps = 0
+
+        while self.isSolving:
+            self.currentIndex, solutionsFound = self.solver.backtracking_solver_tick(
+                self.lastNodeValues,
+                self.currentIndex,
+                self.emptyNodes,
+                self.numberOfSolutions
+            )
+            steps += 1
+
+            if solutionsFound == 1 or self.currentIndex < 0:
+                # Solution found or no more solutions possible
+                self.isSolving = False
+            elif mode == "steps" and steps >= amount:
+                break
+            elif mode == "ms" and time.perf_counter() >= deadline:
+                break
+
+        self.solveSteps += steps
+        self.showSolveStats()
+
+    def showSolveStats(self, force=False):
+        # live step count and speed of the solver in the window title, updated a few times per second
+        now = time.perf_counter()
+        if not force and self.isSolving and now - self.lastStatsTime < 0.25:
+            return
+        self.lastStatsTime = now
+
+        elapsed = max(now - self.solveStartTime, 1e-9)
+        mode, amount = SOLVE_SPEEDS[self.solveSpeed]
+        speed = "instant" if mode == "instant" else f"{amount} {mode}/frame"
+        state = "solving" if self.isSolving else "solved" if self.board.isSolved() else "stopped"
+        pygame.display.set_caption(f"SuDoku - {state}: {self.solveSteps} steps, "
+                                   f"{self.solveSteps / elapsed:.0f} steps/s, speed {speed} (+/-)")
+
+    def isCommand(self, event, key):
+        # the commands are letters => on boards that use the letter as a value (16x16 and up) they need ctrl
+        return event.key == key and (pygame.key.name(key).upper() not in self.symbols or
+                                     bool(event.mod & pygame.KMOD_CTRL))
+
+    def showAnswer(self):
+        # the known solution, or a solve in the worker, replaces the values of the player
+        self.board.resetNodesOnBoardThatUserChanged()
+        if not (self.board.solution and self.board.showSolution()):
+            self.startJob(solveState, self.board.getState(), self.board.variant)
+
+    def hint(self):
+        # reveal the selected node, or the first wrong (then the first empty) node when the selected one is right
+        solution = self.board.getSolution()
+        if not solution:
+            pygame.display.set_caption("SuDoku - no hint, the puzzle doesn't have exactly one solution")
+            return
+
+        candidates = []
+        if self.selectedX is not None and self.selectedY is not None:
+            candidates.append(self.selectedY * self.board.width + self.selectedX)
+        candidates += [index for index, value in enumerate(self.board.values) if value and value != solution[index]]
+        candidates += [index for index, value in enumerate(self.board.values) if not value]
+
+        for index in candidates:
+            if not self.board.givens[index] and self.board.values[index] != solution[index]:
+                x, y = index % self.board.width, index // self.board.width
+                self.board.revealValue(x, y)
+                self.board.clearNotes(x, y)
+                self.selectedX, self.selectedY = x, y
+                return
+
+    def startJob(self, function, *args):
+        self.cancelJob()
+        self.isSolving = False
+        self.job = Job(function, *args)
+        pygame.display.set_caption(f"SuDoku - {self.job.name} (SPACE to cancel)")
+
+    def cancelJob(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+            self.cellStates = None
+            pygame.display.set_caption("SuDoku - cancelled")
+
+    def pollJob(self):
+        # never waits for the worker, the finished result replaces the whole board at once
+        if not self.job.poll():
+            return
+
+        if self.job.error is not None:
+            pygame.display.set_caption(f"SuDoku - {self.job.name} failed: {self.job.error}")
+        else:
+            state, variant, solution = self.job.result
+            if state is None:
+                # only the solution of the board that is shown
+                if variant == self.board.variant:
+                    self.board.solution = solution
+            else:
+                width = self.board.width
+                self.board.setState(state, variant, solution)
+                if self.board.width != width:
+                    self.setLayout()
+            pygame.display.set_caption("SuDoku")
+        self.job = None
+        self.cellStates = None
+
+    def getGlyph(self, font, value, color):
+        key = (font, value, color)
+        if key not in self.glyphs:
+            self.glyphs[key] = font.render(SYMBOLS[value - 1], False, color)
+        return self.glyphs[key]
+
     def showBoard(self):
+        # full repaint => background and lines, every cell is drawn again by showChanges
         fullScreen = pygame.Rect(0, 0, self.BOARD_WIDTH, self.BOARD_HEIGHT)
         self.SCREEN.fill(WHITE, fullScreen)
 
-        # show lines around on board
-        for x in range(0, self.BOARD_WIDTH, self.SQUARE_SIDE_SIZE):
-            n = 1
-            if x % 3 == 0:
-                n = self.BOLD_LINE
-            pygame.draw.line(self.SCREEN, BLACK, (x, 0), (x, self.BOARD_HEIGHT), n)
-
-        for y in range(0, self.BOARD_HEIGHT, self.SQUARE_SIDE_SIZE):
-            n = 1
-            if y % 3 == 0:
-                n = self.BOLD_LINE
-            pygame.draw.line(self.SCREEN, BLACK, (0, y), (self.BOARD_WIDTH, y), n)
-    
-
-    
-
-    def showNumbersOnBoard(self):
-        # draw symbols on board
-        for x, graphicsX in zip(range(self.board.width),
-                               range(int(self.SQUARE_SIDE_SIZE / 2) - 5, self.BOARD_WIDTH, self.SQUARE_SIDE_SIZE)):
-            for y, graphicsY in zip(range(self.board.height),
-                                   range(int(self.SQUARE_SIDE_SIZE / 2) - 8, self.BOARD_HEIGHT,
-                                         self.SQUARE_SIDE_SIZE)):
-
-                symbol = str(self.board.board[y][x].value)
-                if symbol == "0":
-                    note_nums = self.board.getBoardNode(x, y).note_nums
-                    biasY = - 15
-                    biasX = - 15
-                    for note_num in note_nums:
-                        if note_num != 0:
-                            self.SCREEN.blit(NOTE_FONT.render(str(note_num), False, BROWN), (graphicsX + biasX,
-                                                                                            graphicsY + biasY))
-                            if biasX == 15:
-                                biasX = - 15
-                                biasY += 15
-                            else:
-                                biasX += 15
+        # show lines around on board, bold lines between boxes (or jigsaw regions)
+        side = self.SQUARE_SIDE_SIZE
+        for y in range(self.board.height):
+            for x in range(self.board.width + 1):
+                n = self.BOLD_LINE if self.isBoxEdge(x - 1, y, x, y) else 1
+                pygame.draw.line(self.SCREEN, BLACK, (x * side, y * side), (x * side, (y + 1) * side), n)
+
+        for x in range(self.board.width):
+            for y in range(self.board.height + 1):
+                n = self.BOLD_LINE if self.isBoxEdge(x, y - 1, x, y) else 1
+                pygame.draw.line(self.SCREEN, BLACK, (x * side, y * side), ((x + 1) * side, y * side), n)
+
+        # killer cages
+        self.cageOf = [-1] * (self.board.width * self.board.height)
+        self.cageSums = {}
+        for cage, (total, cells) in enumerate(self.board.variant.cages):
+            for index in cells:
+                self.cageOf[index] = cage
+            self.cageSums[min(cells)] = total
+
+        self.cellStates = [None] * (self.board.width * self.board.height)
+
+    def isBoxEdge(self, x1, y1, x2, y2):
+        # the line between two neighbouring nodes is a box border (the board border counts as well)
+        if not (0 <= x1 < self.board.width and 0 <= y1 < self.board.height and
+                0 <= x2 < self.board.width and 0 <= y2 < self.board.height):
+            return True
+        return self.board.getBoxIndex(x1, y1) != self.board.getBoxIndex(x2, y2)
+
+    def getCellState(self, x, y):
+        # everything that decides how a cell looks => background, value, its color and the notes
+        node = self.board.getBoardNode(x, y)
+        value = node.value
+
+        background = WHITE
+        if self.board.variant.kind == "diagonal" and (x == y or x + y == self.board.width - 1):
+            background = LIGHT_BLUE
+        if self.selectedX is not None and self.selectedY is not None:
+            if x == self.selectedX and y == self.selectedY:
+                if self.addingNotes:
+                    background = DARK_GREEN
+                elif not node.user_cannot_change:
+                    background = GREEN
                 else:
-                    color = BLUE
-
-                    if self.board.board[y][x].user_cannot_change or len(self.board.getNodesWithoutValue()) == 0:
-                        color = BLACK
-
-                    if self.invalidNodes is not None:
-                        print("invalidNodes", self.invalidNodes)
-                        for node in self.invalidNodes:
-                            if node[0] == x and node[1] == y:
-                                color = RED
-                                break
-                    
+                    background = BLUE
+            elif x == self.selectedX or y == self.selectedY or \
+                    (self.board.getBoxIndex(x, y) == self.board.getBoxIndex(self.selectedX, self.selectedY)):
+                background = GREY
+
+        if not value:
+            return background, 0, None, self.board.getShownNotesMask(x, y)
+
+        color = BLUE
+        if node.user_cannot_change or self.board.isComplete():
+            color = BLACK
+        # a value that clashes with another one or isn't the one of the solution
+        if self.board.isNodeConflicting(x, y) or (not self.isSolving and self.board.isMistake(x, y)):
+            color = RED
+        return background, value, color, 0
+
+    def showChanges(self):
+        # redraw only the cells that look different than last frame, returns the changed screen areas
+        fullRepaint = self.cellStates is None
+        if fullRepaint:
+            self.showBoard()
 
-                    text = FONT.render(symbol, False, color)
-                    self.SCREEN.blit(text, (graphicsX, graphicsY))
+        dirtyRects = []
+        for y in range(self.board.height):
+            for x in range(self.board.width):
+                state = self.getCellState(x, y)
+                index = y * self.board.width + x
+                if state != self.cellStates[index]:
+                    self.cellStates[index] = state
+                    dirtyRects.append(self.showSelected(x, y, state[0]))
+                    self.showNumbersOnBoard(x, y, state)
+
+        if fullRepaint:
+            return [pygame.Rect(0, 0, self.BOARD_WIDTH, self.BOARD_HEIGHT)]
+        return dirtyRects
+
+    def showNumbersOnBoard(self, x, y, state):
+        # draw the symbol or the notes of one cell
+        _, value, color, notes = state
+        graphicsX = x * self.SQUARE_SIDE_SIZE
+        graphicsY = y * self.SQUARE_SIDE_SIZE
+
+        if self.board.variant.cages:
+            self.showCage(x, y)
+
+        if value:
+            glyph = self.getGlyph(self.font, value, color)
+            center = (graphicsX + self.SQUARE_SIDE_SIZE // 2, graphicsY + self.SQUARE_SIDE_SIZE // 2)
+            self.SCREEN.blit(glyph, glyph.get_rect(center=center))
+            return
+
+        # the notes fill the square row by row, box size notes per row, and never leave the square
+        noteSize = self.SQUARE_SIDE_SIZE / self.board.box_size
+        square = pygame.Rect(graphicsX + 2, graphicsY + 2, self.SQUARE_SIDE_SIZE - 3, self.SQUARE_SIDE_SIZE - 3)
+        slot = 0
+        while notes:
+            # lowest set bit => the smallest note left
+            bit = notes & -notes
+            notes ^= bit
+            row, column = divmod(slot, self.board.box_size)
+            glyph = self.getGlyph(self.noteFont, bit.bit_length() - 1, BROWN)
+            center = (int(graphicsX + (column + 0.5) * noteSize), int(graphicsY + (row + 0.5) * noteSize))
+            self.SCREEN.blit(glyph, glyph.get_rect(center=center).clamp(square))
+            slot += 1
+
+    def showCage(self, x, y):
+        # thin lines inside the node where the cage ends and the sum on the first node of the cage
+        index = y * self.board.width + x
+        left, top = x * self.SQUARE_SIDE_SIZE + 4, y * self.SQUARE_SIDE_SIZE + 4
+        right, bottom = left + self.SQUARE_SIDE_SIZE - 8, top + self.SQUARE_SIDE_SIZE - 8
+
+        def otherCage(neighbourX, neighbourY):
+            if not (0 <= neighbourX < self.board.width and 0 <= neighbourY < self.board.height):
+                return True
+            return self.cageOf[neighbourY * self.board.width + neighbourX] != self.cageOf[index]
+
+        if otherCage(x - 1, y):
+            pygame.draw.line(self.SCREEN, BLACK, (left, top), (left, bottom))
+        if otherCage(x + 1, y):
+            pygame.draw.line(self.SCREEN, BLACK, (right, top), (right, bottom))
+        if otherCage(x, y - 1):
+            pygame.draw.line(self.SCREEN, BLACK, (left, top), (right, top))
+        if otherCage(x, y + 1):
+            pygame.draw.line(self.SCREEN, BLACK, (left, bottom), (right, bottom))
+
+        if index in self.cageSums:
+            key = (CAGE_FONT, "cage", self.cageSums[index])
+            if key not in self.glyphs:
+                self.glyphs[key] = CAGE_FONT.render(str(self.cageSums[index]), False, BLACK)
+            self.SCREEN.blit(self.glyphs[key], (left + 1, top + 1))
 
     def showSelected(self, x, y, color):
         # show selected
 
         # account for lines that separate nodes
         boarderFrontX, boarderFrontY, boarderBackX, boarderBackY = 1, 1, 1, 1
-        if x % 3 == 0:
+        if self.isBoxEdge(x - 1, y, x, y):
             boarderFrontX = 2
             boarderBackX = 2
 
-        if y % 3 == 0:
+        if self.isBoxEdge(x, y - 1, x, y):
             boarderFrontY = 2
             boarderBackY = 2
 
-        if (x + 1) % 3 == 0:
-            boarderBackX = 2
+        if self.isBoxEdge(x, y, x + 1, y):
+            boarderBackX += 1
 
-        if (y + 1) % 3 == 0:
-            boarderBackY = 2
+        if self.isBoxEdge(x, y, x, y + 1):
+            boarderBackY += 1
 
         # create the square using rect
         selectedSquare = pygame.Rect(x * self.SQUARE_SIDE_SIZE + boarderFrontX,
@@ -149,135 +427,131 @@ class Graphics:
 
         # change color depending if current user input is valid or not
         self.SCREEN.fill(color, selectedSquare)
+        return selectedSquare
 
     def eventHandler(self):
         # handle events
+        self.cellStates = None
         while True:
-            self.showBoard()
-
             if self.isSolving:
-                self.currentIndex, solutionsFound = self.solver.backtracking_solver_tick(
-                    self.lastNodeValues, 
-                    self.currentIndex,
-                    self.emptyNodes, 
-                    self.numberOfSolutions
-                )
-                
-                if solutionsFound == 1:
-                    # Solution found or no more solutions possible
-                    self.isSolving = False
-
-            isSelected = self.selectedX is not None and self.selectedY is not None
-
-            if isSelected:
-                for x in range(self.board.width):
-                    self.showSelected(x, self.selectedY, GREY)
-
-                for y in range(self.board.width):
-                    self.showSelected(self.selectedX, y, GREY)
+                self.advanceSolver()
+                self.changed = True
 
-                startRow = self.selectedX - self.selectedX % 3
-                startCol = self.selectedY - self.selectedY % 3
+            if self.job is not None:
+                self.pollJob()
+                self.changed = True
 
-                for x in range(3):
-                    for y in range(3):
-                        self.showSelected(startRow + x, startCol + y, GREY)
-
-                if self.addingNotes:
-                    self.showSelected(self.selectedX, self.selectedY, DARK_GREEN)
-                elif not self.board.board[self.selectedY][self.selectedX].user_cannot_change:
-                    self.showSelected(self.selectedX, self.selectedY, GREEN)
-                else:
-                    self.showSelected(self.selectedX, self.selectedY, BLUE)
+            isSelected = self.selectedX is not None and self.selectedY is not None
 
-            self.showNumbersOnBoard()
+            dirtyRects = []
+            if self.changed or self.cellStates is None:
+                dirtyRects = self.showChanges()
+                self.changed = False
+            if self.job is not None:
+                dirtyRects.append(self.loading(self.job.progress))
 
             mouseX, mouseY = pygame.mouse.get_pos()
 
             # pygame events
+            keyPressed = False
             for event in pygame.event.get():
+                self.changed = True
                 if event.type == pygame.QUIT:
-                    self.board.saveBoard()
+                    self.cancelJob()
+                    self.board.saveBoard(self.saveFile)
                     pygame.quit()
                     sys.exit()
 
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    # the window content was lost => redraw everything
+                    self.cellStates = None
+
                 if event.type == pygame.KEYDOWN:
-                    validInput = "123456789"
+                    keyPressed = True
+                    symbol = event.unicode.upper()
 
                     # Handle keyboard navigation
                     if event.key == pygame.K_RIGHT:
                         if self.selectedX is None or self.selectedY is None:
                             self.selectedX, self.selectedY = 0, 0
                         else:
-                            self.selectedX = (self.selectedX + 1) % 9
+                            self.selectedX = (self.selectedX + 1) % self.board.width
                     
                     elif event.key == pygame.K_LEFT:
                         if self.selectedX is None or self.selectedY is None:
-                            self.selectedX, self.selectedY = 8, 0
+                            self.selectedX, self.selectedY = self.board.width - 1, 0
                         else:
-                            self.selectedX = (self.selectedX - 1) % 9
+                            self.selectedX = (self.selectedX - 1) % self.board.width
                     
                     elif event.key == pygame.K_DOWN:
                         if self.selectedX is None or self.selectedY is None:
                             self.selectedX, self.selectedY = 0, 0
                         else:
-                            self.selectedY = (self.selectedY + 1) % 9
+                            self.selectedY = (self.selectedY + 1) % self.board.width
                     
                     elif event.key == pygame.K_UP:
                         if self.selectedX is None or self.selectedY is None:
-                            self.selectedX, self.selectedY = 0, 8
+                            self.selectedX, self.selectedY = 0, self.board.height - 1
                         else:
-                            self.selectedY = (self.selectedY - 1) % 9
+                            self.selectedY = (self.selectedY - 1) % self.board.width
 
                     elif isSelected and event.key == pygame.K_BACKSPACE and not self.board.getBoardNode(self.selectedX,
                                                                                     self.selectedY).user_cannot_change:
                         self.board.setValue(self.selectedX, self.selectedY, 0)
 
                     elif event.key == pygame.K_ESCAPE:
-                        self.board.saveBoard()
+                        self.cancelJob()
+                        self.board.saveBoard(self.saveFile)
                         self.createMenu()
                         pygame.quit()
                         break
 
-                    elif event.unicode in validInput and isSelected and not self.isSolving:
+                    elif symbol in self.symbols and isSelected and not self.isSolving and \
+                            not event.mod & pygame.KMOD_CTRL:
                         if not event.unicode == '':
-                            node = self.board.getBoardNode(self.selectedX, self.selectedY)
-                            inputValue = str(event.unicode)
+                            inputValue = self.symbols.index(symbol) + 1
 
                             if self.addingNotes:
-                                if inputValue in node.note_nums:
-                                    node.note_nums.remove(inputValue)
-                                else:
-                                    node.note_nums.append(inputValue)
-                                    node.note_nums.sort()
+                                self.board.toggleNote(self.selectedX, self.selectedY, inputValue)
 
                             elif not self.board.getBoardNode(self.selectedX, self.selectedY).user_cannot_change:
-                                if self.board.getBoardNode(self.selectedX, self.selectedY).value == int(event.unicode):
+                                if self.board.getBoardNode(self.selectedX, self.selectedY).value == inputValue:
                                     self.board.setValue(self.selectedX, self.selectedY, 0)
                                 else:
-                                    self.board.setValue(self.selectedX, self.selectedY, int(event.unicode))
-                                    self.invalidNodes = self.board.isNodeValid(
-                                        self.selectedX, self.selectedY,
-                                        int(event.unicode))
+                                    self.board.setValue(self.selectedX, self.selectedY, inputValue)
 
 
                     elif event.key == pygame.K_DELETE:
                         if isSelected and not self.board.getBoardNode(self.selectedX, self.selectedY).user_cannot_change:
                             self.board.setValue(self.selectedX, self.selectedY, 0)
-                            self.board.getBoardNode(self.selectedX, self.selectedY).note_nums = []
+                            self.board.clearNotes(self.selectedX, self.selectedY)
                             self.addingNotes = False
                             self.selectedX, self.selectedY = None, None
                             self.doubleClick = False
                     
                     elif event.key == pygame.K_SPACE:
-                        if self.isSolving:
+                        if self.job is not None:
+                            self.cancelJob()
+                        elif self.isSolving:
                             self.board.resetNodesOnBoardThatUserChanged()
                             self.isSolving = False
                         else:
-                            self.board.setToRandomPreGeneratedBoard()
-                            self.eventHandler()
+                            self.newGame()
+
+                    elif self.isCommand(event, pygame.K_h) and not self.isSolving and self.job is None:
+                        self.hint()
+
+                    elif self.isCommand(event, pygame.K_n):
+                        # auto notes => the candidates of every empty node instead of the notes of the player
+                        self.board.setAutoNotes(not self.board.auto_notes)
+                        pygame.display.set_caption(f"SuDoku - auto notes {'on' if self.board.auto_notes else 'off'}")
+
+                    elif self.isCommand(event, pygame.K_g):
+                        # a freshly generated puzzle instead of one from the bank
+                        self.startJob(generateState, None, self.board.variant)
 
                     elif event.key == pygame.K_s:
+                        self.cancelJob()
                         self.solver = Solver(self.board, "backtracking")
 
                         if self.isSolving:
@@ -289,6 +563,11 @@ class Graphics:
                             if len(self.emptyNodes) == 0:
                                 self.board.resetNodesOnBoard(self.emptyNodes)
                                 
+                            elif SOLVE_SPEEDS[self.solveSpeed][0] == "instant" or self.board.box_size > 3:
+                                # nothing to animate (or backtracking would never finish on a big board)
+                                # => the known solution, or solve in the worker, and show it at once
+                                self.showAnswer()
+
                             else:
                                 self.board.resetNodesOnBoardThatUserChanged()
                                 self.emptyNodes = self.board.getNodesWithoutValue()
@@ -297,11 +576,21 @@ class Graphics:
                                 self.currentIndex = 0
                                 self.numberOfSolutions = 0
                                 self.lastNodeValues = {}
+                                self.solveSteps = 0
+                                self.solveStartTime = time.perf_counter()
                                 
                                 # Initialize lastNodeValues for each empty node
                                 for node in self.emptyNodes:
                                     self.lastNodeValues[node] = 1
 
+                    elif event.unicode in ("+", "=") or event.key == pygame.K_KP_PLUS:
+                        self.solveSpeed = min(self.solveSpeed + 1, len(SOLVE_SPEEDS) - 1)
+                        self.showSolveStats(force=True)
+
+                    elif event.unicode == "-" or event.key == pygame.K_KP_MINUS:
+                        self.solveSpeed = max(self.solveSpeed - 1, 0)
+                        self.showSolveStats(force=True)
+
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     self.addingNotes = event.button == 3
 
@@ -318,36 +607,83 @@ class Graphics:
                         self.timer = 0
                         self.doubleClick = True
 
+            # autosave => only the moves since the last save are appended to the save file,
+            # the solver animation is saved once it is done
+            if keyPressed and not self.isSolving:
+                self.saveFile.sync(self.board)
+
             if self.doubleClick:
                 self.isDoubleClick()
 
-            pygame.display.update()
+            if dirtyRects:
+                pygame.display.update(dirtyRects)
 
-    def loading(self):
-        rect = pygame.Rect(10, self.BOARD_WIDTH - 100, self.BOARD_WIDTH - 100, self.SQUARE_SIDE_SIZE)
-        self.SCREEN.fill(GREEN, rect)
-        pygame.display.update()
+            # sleep for the rest of the frame, nothing is drawn while nothing changes
+            self.CLOCK.tick(FPS)
+
+    def loading(self, progress):
+        # progress bar of the running job over the bottom of the board, returns its rect
+        rect = pygame.Rect(10, self.BOARD_HEIGHT - 30, self.BOARD_WIDTH - 20, 20)
+        self.SCREEN.fill(DARK_GREEN, rect)
+        self.SCREEN.fill(GREEN, (rect.x, rect.y, int(rect.width * progress), rect.height))
+        return rect
+
+    def newGame(self):
+        # the puzzle bank is classic 9x9, other sizes and the variants are generated
+        if self.boxSize != self.board.box_size or self.variantKind != self.board.variant.kind:
+            self.board.setBoxSize(self.boxSize, Variant(self.variantKind, self.boxSize))
+            self.setLayout()
+
+        if self.boxSize == 3 and self.variantKind == "classic":
+            self.startJob(newGameState, self.difficulty)
+        else:
+            self.startJob(generateState, None, self.board.variant)
 
     def createMenu(self):
         self.isSolving = False
 
         def newGame():
-            self.board.setToRandomPreGeneratedBoard()
+            self.setLayout()
+            self.newGame()
             self.eventHandler()
 
+        def setDifficulty(_, difficulty):
+            self.difficulty = difficulty
+
+        def setBoardSize(_, boxSize):
+            self.boxSize = boxSize
+
+        def setVariant(_, kind):
+            self.variantKind = kind
+
         def resumeGame():
-            self.board.loadBoard()
+            self.board.loadBoard(self.saveFile)
+            self.boxSize = self.board.box_size
+            self.variantKind = self.board.variant.kind
+            self.setLayout()
+            # the solution for checking values and hints is searched while the game goes on
+            self.startJob(solutionOf, self.board.getState(), self.board.variant)
             self.eventHandler()
 
         # create menu
-        surface = create_example_window('SuDoku - Hint: PRESS "S" TO SOLVE',
+        surface = create_example_window('SuDoku - Hint: PRESS "H" FOR A HINT, "S" TO SOLVE (CTRL+H ON 16x16 AND UP)',
                                       (self.BOARD_WIDTH, self.BOARD_HEIGHT))
 
         self.menu = pygame_menu.Menu('SuDoku', self.BOARD_WIDTH, self.BOARD_HEIGHT,
                                    theme=pygame_menu.themes.THEME_DARK)
 
         self.menu.add.button('NEW GAME', newGame)
-        if exists("savedBoard.csv"):
+        # levels without puzzles in the bank aren't offered
+        levels = [None] + levelsWithPuzzles('preGeneratedSudokuBoards.csv')
+        if self.difficulty not in levels:
+            self.difficulty = None
+        self.menu.add.selector('DIFFICULTY ', [('ANY', None)] + [(LEVELS[level].upper(), level) for level in levels[1:]],
+                               default=levels.index(self.difficulty), onchange=setDifficulty)
+        self.menu.add.selector('SIZE ', BOARD_SIZES, default=[boxSize for _, boxSize in BOARD_SIZES].index(self.boxSize),
+                               onchange=setBoardSize)
+        self.menu.add.selector('VARIANT ', [(kind.upper(), kind) for kind in KINDS], default=KINDS.index(self.variantKind),
+                               onchange=setVariant)
+        if self.board.hasSavedBoard():
             self.menu.add.button('RESUME', resumeGame)
 
         self.menu.add.button('QUIT', pygame_menu.events.EXIT)
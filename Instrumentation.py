@@ -0,0 +1,137 @@
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from inspect import getattr_static
+
+from Propagation import PropagationSolver
+
+# where the records of instrumented runs go => any callable that takes a dict,
+# None => nothing is counted and the solvers run their plain code
+sink = None
+
+
+def setSink(newSink):
+    # returns the sink that was set before
+    global sink
+    oldSink, sink = sink, newSink
+    return oldSink
+
+
+@contextmanager
+def recording(newSink):
+    # newSink gets the records of everything run in the with block
+    oldSink = setSink(newSink)
+    try:
+        yield newSink
+    finally:
+        setSink(oldSink)
+
+
+class MemorySink:
+    """
+    Keeps the records in a list.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+
+class JsonLinesSink:
+    """
+    Writes every record as one line of json to a file (a path is appended to) or a stream.
+    """
+
+    def __init__(self, file=None):
+        self.ownsFile = isinstance(file, str)
+        self.file = open(file, 'a') if self.ownsFile else file or sys.stderr
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.ownsFile:
+            self.file.close()
+
+
+def emit(event, **fields):
+    if sink is not None:
+        sink({"event": event, "time": time.time(), **fields})
+
+
+@contextmanager
+def counting(owner, name, counters, key=None):
+    # every call of owner.name adds one to counters[key] (key is called with the arguments when it is
+    # a function) while the with block runs, owner is a class or an instance => the method is only
+    # replaced while something is counted and the plain code doesn't pay for it
+    raw = getattr_static(owner, name)
+    original = raw.__func__ if isinstance(raw, staticmethod) else getattr(owner, name)
+
+    def counted(*args, **kwargs):
+        counters[key(*args) if callable(key) else key or name] += 1
+        return original(*args, **kwargs)
+
+    setattr(owner, name, staticmethod(counted) if isinstance(raw, staticmethod) else counted)
+    try:
+        yield counters
+    finally:
+        if isinstance(owner, type):
+            setattr(owner, name, raw)
+        else:
+            delattr(owner, name)
+
+
+def solveInstrumented(solver, target_solutions=1):
+    # Solver.run with the validity checks and placements on the board and the propagation steps of the
+    # engine counted, the record of the solve is sent to the sink
+    board = solver.board
+    counters = Counter()
+    givens = board.width * board.height - len(board.getNodesWithoutValue())
+
+    startTime = time.perf_counter()
+    with counting(board, "isNodeValid", counters, "checks"), \
+            counting(board, "setValue", counters, lambda *args: "placements" if args[-1] else "clears"), \
+            counting(PropagationSolver, "propagate", counters, "propagations"), \
+            counting(PropagationSolver, "place", counters, "engine_placements"):
+        solutions = solver.run(target_solutions)
+    seconds = time.perf_counter() - startTime
+
+    emit("solve", solver=solver.solver_type, box_size=board.box_size, variant=board.variant.kind, givens=givens,
+         target=target_solutions, solutions=solutions, cached=solver.cached, seconds=seconds, nodes=solver.nodes,
+         backtracks=solver.backtracks, checks=counters["checks"], placements=counters["placements"],
+         clears=counters["clears"], propagations=counters["propagations"],
+         engine_placements=counters["engine_placements"])
+    return solutions
+
+
+def profile(function, *args, memory=False, sortBy="cumulative", limit=25, out=None, **kwargs):
+    # one-off deep dive => function(*args, **kwargs) under cProfile (and tracemalloc with memory),
+    # the most expensive functions and the biggest allocations are printed to out (stderr by default)
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    out = out or sys.stderr
+    profiler = cProfile.Profile()
+    if memory:
+        tracemalloc.start()
+    try:
+        result = profiler.runcall(function, *args, **kwargs)
+    finally:
+        snapshot = peak = None
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        pstats.Stats(profiler, stream=out).sort_stats(sortBy).print_stats(limit)
+        if snapshot is not None:
+            print(f"peak memory {peak / 1024:.1f} KiB, biggest allocations:", file=out)
+            for statistic in snapshot.statistics("lineno")[:limit]:
+                print(f"  {statistic}", file=out)
+    return result
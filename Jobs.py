@@ -0,0 +1,111 @@
+import multiprocessing
+import queue
+import random
+
+from Board import Board
+from Grader import getRatings
+from Solver import Solver
+
+
+def runJob(events, function, args):
+    # entry point of the worker process => every progress update and the result go through the events queue
+    try:
+        result = function(*args, progress=lambda fraction: events.put(("progress", fraction)))
+        events.put(("result", result))
+    except Exception as e:
+        events.put(("error", f"{type(e).__name__}: {e}"))
+
+
+# job functions, they run in the worker process and return a whole board state (see Board.getState)
+# with the variant of the board and the solution of its givens => Board.setState(state, variant, solution)
+
+def solveState(state, variant, solverType="propagation", progress=None):
+    # the solution of the givens when there is exactly one, any solution of the board otherwise
+    board = Board(variant=variant)
+    board.setState(state)
+    if not board.showSolution() and Solver(board, solverType).solve() < 1:
+        raise ValueError("the board has no solution")
+    return board.getState(), board.variant, board.solution
+
+
+def generateState(seed=None, variant=None, progress=None):
+    # a new puzzle of the variant, jigsaw regions and killer cages are new as well
+    board = Board(variant=variant)
+    board.generatePuzzle(rng=random.Random(seed), progress=progress)
+    return board.getState(), board.variant, board.solution
+
+
+def newGameState(difficulty=None, progress=None):
+    # grading the whole bank the first time a difficulty is used is the slow part
+    if difficulty is not None:
+        getRatings('preGeneratedSudokuBoards.csv', progress=progress)
+    # the worker starts with a copy of the random state of the game => a fresh generator
+    # so that two new games don't pick the same puzzle
+    board = Board()
+    board.setToRandomPreGeneratedBoard(difficulty, random.Random())
+    # solved here once => checking the values of the player and hints are lookups in the game
+    board.getSolution()
+    return board.getState(), board.variant, board.solution
+
+
+def solutionOf(state, variant, progress=None):
+    # only the solution of a board that is already in the game (a resumed one) => no state,
+    # the moves the player makes meanwhile stay
+    board = Board(variant=variant)
+    board.setState(state)
+    board.getSolution()
+    return None, board.variant, board.solution
+
+
+class Job:
+    """
+    A function running in a worker process, polled by the game loop for its progress and result without blocking.
+    """
+
+    def __init__(self, function, *args):
+        self.name = function.__name__
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.done = False
+        self.cancelled = False
+
+        self.events = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=runJob, args=(self.events, function, args))
+        self.process.start()
+
+    def poll(self):
+        # handle every event that is waiting, returns True once the job has finished
+        while not self.done:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                if self.process.is_alive():
+                    break
+                # the worker is gone => everything it sent is already in the pipe
+                try:
+                    kind, payload = self.events.get(timeout=0.1)
+                except queue.Empty:
+                    kind, payload = "error", f"worker stopped with exit code {self.process.exitcode}"
+
+            if kind == "progress":
+                self.progress = payload
+            else:
+                if kind == "result":
+                    self.result = payload
+                    self.progress = 1.0
+                else:
+                    self.error = payload
+                self.finish()
+        return self.done
+
+    def cancel(self):
+        if not self.done:
+            self.cancelled = True
+            self.process.terminate()
+            self.finish()
+
+    def finish(self):
+        self.done = True
+        self.process.join()
+        self.events.close()
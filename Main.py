@@ -1,63 +1,161 @@
-import csv
+import argparse
+import random
+import sys
+import Instrumentation
 from Board import Board
-from Graphics import Graphics
+from Instrumentation import JsonLinesSink
+from Propagation import boxSizeOf
+from PuzzleBank import formatPuzzle, getBank, parsePuzzle
+from Solver import Solver
+from Variants import KINDS, Variant
+
+# Graphics (pygame), the process pools and numpy are only imported by the commands that use them
+# => solving, generating and validating from the command line starts without SDL or a display
 
 
 def checkDataSet():
-    for i in range(250):
-        board = Board()
+    # all the puzzles at once when numpy is installed, see BatchValidator.validateBank
+    try:
+        from BatchValidator import validateBank
+    except ImportError:
+        validateBank = None
+
+    if validateBank:
+        valid, _ = validateBank(getBank('preGeneratedSudokuBoards.csv'))
+        for i, isValid in enumerate(valid):
+            if not isValid:
+                print(f"ERROR: {i}")
+        return
+
+    board = Board()
+    for i in range(len(getBank('preGeneratedSudokuBoards.csv'))):
         board.fillBoard()
         board.setToPreGeneratedBoard(i)
 
         for line in board.board:
             for node in line:
-                if len(board.isNodeValid(node, node.value)) > 1 and not str(node.value) == "0":
+                if node.value != 0 and len(board.isNodeValid(node.x, node.y, node.value)) > 1:
                     print(f"ERROR: {i}")
 
 
-def generateSuDokuBoards(numberOfBoards):
-    with open('preGeneratedSudokuBoards.csv', 'a', newline='', encoding='utf-8') as f:
-        with open('preGeneratedSudokuBoards.csv', 'rt') as f2:
+def generateSuDokuBoards(numberOfBoards, workers=None, seed=None):
+    # puzzles are generated on a process pool, see Generator.generateBoards
+    from Generator import generateBoards
+    return generateBoards(numberOfBoards, 'preGeneratedSudokuBoards.csv', workers, seed)
 
-            reader = csv.reader(f2, delimiter=',')
-            writer = csv.writer(f)
 
-            for _ in range(numberOfBoards):
-                board.fillBoard()
-                if board.generatePuzzle(10000000):
+def solveAndSaveSuDokuBoard(workers=None):
+    # puzzles are streamed through a process pool, see BulkSolver.solveFile
+    from BulkSolver import solveFile
+    return solveFile('preGeneratedSudokuBoards.csv', 'preSolvedSudokuBoards.csv', workers)
 
-                    output = board.getValuesDefault()
 
-                    if output not in reader:
-                        print("\nSUCCESS\n\n")
-                        writer.writerow(output)
-                    else:
-                        print("this board is already preGenerated")
+def play():
+    from Graphics import Graphics
 
+    board = Board()
+    board.fillBoard()
 
-def solveAndSaveSuDokuBoard():
-    with open('preSolvedSudokuBoards.csv', 'a') as f:
-        with open('preGeneratedSudokuBoards.csv', 'rt') as f2:
-            reader = list(csv.reader(f2, delimiter=','))
-            writer = csv.writer(f)
+    g = Graphics(board)
+    g.createMenu()
 
-            for line in reader:
 
-                board = Board()
-                board.fillBoard()
-                board.setBoardWithDefaultValues(line)
-                board.backTrackingRecursion(board.getNodesWithoutValue())
-                board.printBoard()
-                print("SOLVED")
-                writer.writerow(board.getValues())
+def readPuzzles(puzzles):
+    # puzzles of the command line or one per line of stdin, a puzzle that can't be read is printed
+    # to stderr with the reason and comes with None instead of a board
+    for puzzle in puzzles or (line for line in sys.stdin if line.strip()):
+        try:
+            values = parsePuzzle(puzzle)
+            board = Board(boxSizeOf(len(values)))
+            if max(values) > board.width:
+                symbol = formatPuzzle([max(values)])
+                raise ValueError(f"{symbol!r} is not a value of a {board.width}x{board.width} sudoku")
+        except ValueError as e:
+            print(f"{e}: {puzzle.strip()}", file=sys.stderr)
+            yield puzzle.strip(), None
+            continue
+        board.setBoardWithDefaultValues(values)
+        yield puzzle.strip(), board
+
+
+def solveCommand(args):
+    unsolved = 0
+    for puzzle, board in readPuzzles(args.puzzles):
+        if board is None:
+            unsolved += 1
+            continue
+        if Solver(board, args.solver).solve() == 1:
+            print(formatPuzzle(board.getValues()))
+        else:
+            print(f"no solution: {puzzle}", file=sys.stderr)
+            unsolved += 1
+    return 1 if unsolved else 0
+
+
+def generateCommand(args):
+    rng = random.Random(args.seed)
+    board = Board(args.box_size, Variant(args.variant, args.box_size))
+    for _ in range(args.count):
+        board.generatePuzzle(rng=rng)
+        # the rules of a variant (regions, cages) are printed after the puzzle
+        print(formatPuzzle(board.getValuesDefault()) +
+              (f" {board.variant.toJson()}" if board.variant.kind != "classic" else ""))
+    return 0
+
+
+def validateCommand(args):
+    invalid = 0
+    for puzzle, board in readPuzzles(args.puzzles):
+        if board is None:
+            invalid += 1
+            continue
+        if board.conflict_count:
+            state = "invalid"
+            invalid += 1
+        else:
+            state = "solved" if board.isSolved() else "valid"
+        print(f"{state} {puzzle}")
+    return 1 if invalid else 0
 
 
 if __name__ == '__main__':
-    # solveAndSaveSuDokuBoard()
-    # checkDataSet()
-
-    board = Board()
-    board.fillBoard()
-
-    g = Graphics(board)
-    g.createMenu()
+    parser = argparse.ArgumentParser(description="SuDoku, without a command the game is started.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("play", help="start the game")
+
+    # options of every command that runs without the game, see Instrumentation
+    instrumentParser = argparse.ArgumentParser(add_help=False)
+    instrumentParser.add_argument("--stats", metavar="PATH", default=None,
+                                  help="write a json line per solve and generated puzzle to PATH, - => stderr")
+    instrumentParser.add_argument("--profile", action="store_true", help="print a cProfile report to stderr")
+    instrumentParser.add_argument("--trace-memory", action="store_true",
+                                  help="print the biggest allocations (tracemalloc) with the profile")
+
+    solveParser = commands.add_parser("solve", parents=[instrumentParser],
+                                      help="print the solution of every puzzle")
+    solveParser.add_argument("puzzles", nargs='*', help="puzzles like 003020600900305001..., read from stdin when empty")
+    solveParser.add_argument("--solver", choices=["propagation", "dlx", "backtracking"], default="propagation")
+    solveParser.set_defaults(run=solveCommand)
+
+    generateParser = commands.add_parser("generate", parents=[instrumentParser], help="print new puzzles")
+    generateParser.add_argument("--count", type=int, default=1)
+    generateParser.add_argument("--box-size", type=int, default=3, help="3 => 9x9, 4 => 16x16, 5 => 25x25")
+    generateParser.add_argument("--variant", choices=KINDS, default="classic")
+    generateParser.add_argument("--seed", type=int, default=None)
+    generateParser.set_defaults(run=generateCommand)
+
+    validateParser = commands.add_parser("validate", parents=[instrumentParser],
+                                         help="check the givens of every puzzle")
+    validateParser.add_argument("puzzles", nargs='*', help="read from stdin when empty")
+    validateParser.set_defaults(run=validateCommand)
+
+    args = parser.parse_args()
+    if args.command in (None, "play"):
+        play()
+        sys.exit(0)
+
+    if args.stats:
+        Instrumentation.setSink(JsonLinesSink(sys.stderr if args.stats == "-" else args.stats))
+    if args.profile or args.trace_memory:
+        sys.exit(Instrumentation.profile(args.run, args, memory=args.trace_memory))
+    sys.exit(args.run(args))
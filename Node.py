@@ -1,10 +1,41 @@
 class Node:
-    def __init__(self, x, y, value):
+    # a view of one node on the board, the state itself lives in the board's arrays
+    __slots__ = ("board", "x", "y", "index")
+
+    def __init__(self, board, x, y):
+        self.board = board
         self.x = x
         self.y = y
-        self.value: int = value
-        self.user_cannot_change = False
-        self.note_nums = []
+        self.index = y * board.width + x
+
+    @property
+    def value(self) -> int:
+        return self.board.values[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.board.setValue(self.x, self.y, value)
+
+    @property
+    def user_cannot_change(self) -> bool:
+        return bool(self.board.givens[self.index])
+
+    @user_cannot_change.setter
+    def user_cannot_change(self, userCannotChange):
+        self.board.givens[self.index] = bool(userCannotChange)
+        self.board.solution = None
+
+    @property
+    def note_nums(self):
+        mask = self.board.notes[self.index]
+        return [value for value in range(1, self.board.width + 1) if mask & (1 << value)]
+
+    @note_nums.setter
+    def note_nums(self, values):
+        mask = 0
+        for value in values:
+            mask |= 1 << int(value)
+        self.board.notes[self.index] = mask
 
     def __str__(self):
         return f"|{self.value}|"
@@ -0,0 +1,269 @@
+from functools import lru_cache
+from math import isqrt
+from typing import List, NamedTuple, Sequence, Tuple
+
+from Variants import Variant
+
+
+class Tables(NamedTuple):
+    # lookup tables of a board of size x size cells with boxes of boxSize x boxSize (size = boxSize ** 2),
+    # cells are indexed row by row => index = y * size + x
+    boxSize: int
+    size: int
+    cells: int
+    allValues: int
+    units: List[List[int]]
+    peers: List[List[int]]
+    popcount: Sequence[int]
+    maskValues: Sequence[List[int]]
+    cages: Sequence[Tuple[int, Tuple[int, ...]]]
+
+
+class _MaskTable(dict):
+    # lookup table that is filled on first use, a full table of every mask is too big for 16x16 and up
+    def __init__(self, function):
+        super().__init__()
+        self.function = function
+
+    def __missing__(self, mask):
+        self[mask] = result = self.function(mask)
+        return result
+
+
+# popcount and mask values tables that are already built, keyed by size
+_maskTables = {}
+
+
+def boxSizeOf(cells):
+    # box size of a board with the given number of cells, 81 => 3
+    boxSize = isqrt(isqrt(cells))
+    if boxSize < 2 or boxSize ** 4 != cells:
+        raise ValueError(f"{cells} cells is not a sudoku board")
+    return boxSize
+
+
+def getTables(boxSize=3, variant=None):
+    # tables of the classic sudoku with this box size or of the variant
+    return _buildTables(variant or Variant(boxSize=boxSize))
+
+
+@lru_cache(maxsize=16)
+def _buildTables(variant):
+    boxSize = variant.boxSize
+    size = boxSize * boxSize
+    cells = size * size
+
+    # every row, column, box (or jigsaw region) and diagonal as a list of cell indices
+    units = variant.units()
+
+    # all the cells that share a unit or a cage with the cell (20 for every cell of a classic 9x9 board)
+    groupsOf = [[] for _ in range(cells)]
+    for group in units + [cage for _, cage in variant.cages]:
+        for cell in group:
+            groupsOf[cell].append(group)
+    peers = [sorted({peer for group in groupsOf[cell] for peer in group} - {cell}) for cell in range(cells)]
+
+    # number of set bits and the values of a candidate mask
+    def maskValues(mask):
+        return [value for value in range(1, size + 1) if mask & (1 << value)]
+
+    if size not in _maskTables:
+        if size <= 9:
+            _maskTables[size] = ([bin(mask).count("1") for mask in range(1 << (size + 1))],
+                                 [maskValues(mask) for mask in range(1 << (size + 1))])
+        else:
+            _maskTables[size] = (_MaskTable(lambda mask: bin(mask).count("1")), _MaskTable(maskValues))
+    popcount, maskValuesTable = _maskTables[size]
+
+    return Tables(boxSize, size, cells, (1 << (size + 1)) - 2, units, peers, popcount, maskValuesTable,
+                  variant.cages)
+
+
+# sudoku 9x9 tables
+SIZE, CELLS, ALL_VALUES = getTables(3)[1:4]
+UNITS, PEERS, POPCOUNT, MASK_VALUES = getTables(3)[4:8]
+
+
+class PropagationSolver:
+    """
+    Solves a flat list of size * size values (0 = empty, 81 for 9x9) by propagating naked and hidden singles
+    and branching on the empty cell with the fewest remaining values (MRV).
+    With rng set, the values of a branch are tried in random order => random solutions.
+    exclude lists (cell, value) pairs that are not allowed in any solution.
+    With max_nodes set, the search gives up after that many nodes and solve returns -1.
+    variant adds the rules of a sudoku variant (see Variants.Variant), killer cage sums prune the candidates.
+    """
+
+    def __init__(self, values, target_solutions=1, rng=None, exclude=(), max_nodes=0, variant=None):
+        self.values = [int(value) for value in values]
+        self.tables = getTables(boxSizeOf(len(self.values)), variant)
+        self.target_solutions = target_solutions
+        self.rng = rng
+        self.exclude = exclude
+        self.max_nodes = max_nodes
+
+        self.solutions: List[List[int]] = []
+        self.nodes = 0
+        self.backtracks = 0
+
+    def solve(self):
+        self.solutions = []
+        self.nodes = 0
+        self.backtracks = 0
+
+        values = [0] * self.tables.cells
+        candidates = [self.tables.allValues] * self.tables.cells
+        for cell, value in self.exclude:
+            candidates[cell] &= ~(1 << value)
+
+        # place the givens, conflicting givens mean that there is no solution
+        for cell, value in enumerate(self.values):
+            if value:
+                if not candidates[cell] & (1 << value) or \
+                        not self.place(values, candidates, cell, value, self.tables.peers):
+                    return 0
+
+        try:
+            self.search(values, candidates)
+        except _SearchLimitReached:
+            return -1
+        return len(self.solutions)
+
+    @staticmethod
+    def place(values, candidates, cell, value, peers=PEERS):
+        # set the value and remove it from all peers, returns False on a contradiction
+        bit = 1 << value
+        values[cell] = value
+        candidates[cell] = bit
+
+        for peer in peers[cell]:
+            if candidates[peer] & bit:
+                if values[peer]:
+                    return False
+                candidates[peer] &= ~bit
+                if not candidates[peer]:
+                    return False
+        return True
+
+    def propagate(self, values, candidates):
+        # place naked and hidden singles until nothing changes, returns False on a contradiction
+        _, _, cells, allValues, units, peers, popcount, maskValues, cages = self.tables
+        place = self.place
+        changed = True
+        while changed:
+            changed = False
+
+            # naked singles => an empty cell with only one candidate
+            for cell in range(cells):
+                if not values[cell] and popcount[candidates[cell]] == 1:
+                    if not place(values, candidates, cell, maskValues[candidates[cell]][0], peers):
+                        return False
+                    changed = True
+
+            # hidden singles => a value that fits only one cell of a unit
+            for unit in units:
+                once = twice = 0
+                for cell in unit:
+                    twice |= once & candidates[cell]
+                    once |= candidates[cell]
+
+                if once != allValues:
+                    return False
+
+                hidden = once & ~twice
+                if hidden:
+                    for cell in unit:
+                        if not values[cell] and candidates[cell] & hidden:
+                            value = maskValues[candidates[cell] & hidden]
+                            if len(value) > 1 or not place(values, candidates, cell, value[0], peers):
+                                return False
+                            changed = True
+
+            # killer cages => values that can't reach the cage sum
+            if cages and not changed:
+                pruned = self.pruneCages(values, candidates)
+                if pruned is None:
+                    return False
+                changed = pruned
+        return True
+
+    def pruneCages(self, values, candidates):
+        # remove the candidates of cage cells that leave a sum the other empty cells of the cage can't make,
+        # returns None on a contradiction, otherwise whether a candidate was removed
+        maskValues = self.tables.maskValues
+        changed = False
+        for total, cage in self.tables.cages:
+            remaining = total
+            empty = []
+            for cell in cage:
+                if values[cell]:
+                    remaining -= values[cell]
+                else:
+                    empty.append(cell)
+
+            if not empty:
+                if remaining:
+                    return None
+                continue
+
+            pool = 0
+            for cell in empty:
+                pool |= candidates[cell]
+            others = len(empty) - 1
+
+            for cell in empty:
+                for value in maskValues[candidates[cell]]:
+                    # the smallest and the biggest sum of the other empty cells without this value
+                    rest = maskValues[pool & ~(1 << value)]
+                    if len(rest) < others or \
+                            not sum(rest[:others]) <= remaining - value <= sum(rest[len(rest) - others:]):
+                        candidates[cell] &= ~(1 << value)
+                        changed = True
+                if not candidates[cell]:
+                    return None
+        return changed
+
+    def search(self, values, candidates):
+        # returns True once target_solutions solutions have been found
+        self.nodes += 1
+        if self.max_nodes and self.nodes > self.max_nodes:
+            raise _SearchLimitReached
+
+        if not self.propagate(values, candidates):
+            self.backtracks += 1
+            return False
+
+        # minimum remaining values => branch on the cell with the fewest candidates
+        popcount = self.tables.popcount
+        bestCell = -1
+        bestCount = self.tables.size + 1
+        for cell in range(self.tables.cells):
+            if not values[cell]:
+                count = popcount[candidates[cell]]
+                if count < bestCount:
+                    bestCell, bestCount = cell, count
+                    if count == 2:
+                        break
+
+        if bestCell == -1:
+            self.solutions.append(values)
+            return 0 < self.target_solutions <= len(self.solutions)
+
+        branchValues = self.tables.maskValues[candidates[bestCell]]
+        if self.rng is not None:
+            branchValues = self.rng.sample(branchValues, len(branchValues))
+
+        for value in branchValues:
+            nextValues = values[:]
+            nextCandidates = candidates[:]
+            if self.place(nextValues, nextCandidates, bestCell, value, self.tables.peers):
+                if self.search(nextValues, nextCandidates):
+                    return True
+            else:
+                self.backtracks += 1
+
+        return False
+
+
+class _SearchLimitReached(Exception):
+    pass
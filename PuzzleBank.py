@@ -0,0 +1,157 @@
+import argparse
+import csv
+import mmap
+import os
+import random
+import struct
+
+from Propagation import boxSizeOf
+
+# bank file layout
+# header: magic, version, bits per cell, number of cells per puzzle, number of puzzles
+# records: fixed width puzzles, two cells per byte (high nibble first) for boards up to 9x9 (values up to 15)
+#          or one cell per byte for bigger boards
+MAGIC = b"SDKB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+
+# the two cells stored in every possible byte
+_NIBBLES = [(byte >> 4, byte & 0x0F) for byte in range(256)]
+
+# banks that are already open, keyed by path
+_openBanks = {}
+
+# a value as one character in puzzle strings, 0 (or ".") is an empty node and values above 9 are letters
+SYMBOLS = "0123456789ABCDEFGHIJKLMNOP"
+
+
+def parsePuzzle(puzzle):
+    # a string of symbols or a list of values => list of values
+    if isinstance(puzzle, str):
+        symbols = puzzle.strip().upper()
+        for symbol in symbols:
+            if symbol not in SYMBOLS and symbol != ".":
+                raise ValueError(f"{symbol!r} is not a value of a sudoku")
+        return [0 if symbol == "." else SYMBOLS.index(symbol) for symbol in symbols]
+    return [int(value) for value in puzzle]
+
+
+def formatPuzzle(values):
+    return "".join(SYMBOLS[value] for value in values)
+
+
+def bitsPerCell(cells):
+    # the values of a board of this many cells fit in a nibble up to 15x15
+    return 4 if boxSizeOf(cells) ** 2 <= 15 else 8
+
+
+def recordSize(cells, bits):
+    return (cells * bits + 7) // 8
+
+
+def packPuzzle(values, bits=4):
+    values = [int(value) for value in values]
+    if bits == 8:
+        return bytes(values)
+    if len(values) % 2:
+        values.append(0)
+    return bytes((values[i] << 4) | values[i + 1] for i in range(0, len(values), 2))
+
+
+def unpackPuzzle(record, cells, bits=4):
+    if bits == 8:
+        return list(record[:cells])
+    return [value for byte in record for value in _NIBBLES[byte]][:cells]
+
+
+class PuzzleBank:
+    """
+    Read-only, memory-mapped bank of puzzles with O(1) access by index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.bits, self.cells, self.count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION or self.bits not in (4, 8):
+            self.mmap.close()
+            raise ValueError(f"{path} is not a puzzle bank")
+        self.recordSize = recordSize(self.cells, self.bits)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("puzzle index out of range")
+
+        start = HEADER.size + index * self.recordSize
+        return unpackPuzzle(self.mmap[start:start + self.recordSize], self.cells, self.bits)
+
+    def randomIndex(self, rng=random):
+        return rng.randrange(self.count)
+
+    def randomPuzzle(self, rng=random):
+        return self[self.randomIndex(rng)]
+
+    def close(self):
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def convertCsv(csvPath, bankPath, cells=None):
+    # stream a csv file of puzzles into a bank file, returns the number of puzzles,
+    # without cells the size of the first puzzle is used for all of them
+    count = 0
+    bits = bitsPerCell(cells) if cells else 4
+    tmpPath = bankPath + ".tmp"
+    with open(csvPath, 'rt') as source, open(tmpPath, 'wb') as target:
+        target.write(HEADER.pack(MAGIC, VERSION, bits, cells or 0, 0))
+        for line in csv.reader(source, delimiter=','):
+            if line:
+                if cells is None:
+                    cells = len(line)
+                    bits = bitsPerCell(cells)
+                if len(line) != cells:
+                    raise ValueError(f"line {count + 1} of {csvPath} has {len(line)} cells instead of {cells}")
+                target.write(packPuzzle(line, bits))
+                count += 1
+
+        # the number of puzzles is only known at the end
+        target.seek(0)
+        target.write(HEADER.pack(MAGIC, VERSION, bits, cells or 81, count))
+
+    os.replace(tmpPath, bankPath)
+    return count
+
+
+def getBank(csvPath='preGeneratedSudokuBoards.csv'):
+    # open the bank next to the csv file, it is (re)built when the csv file is newer
+    bankPath = os.path.splitext(csvPath)[0] + ".bank"
+    if not os.path.exists(bankPath) or os.path.getmtime(bankPath) < os.path.getmtime(csvPath):
+        if bankPath in _openBanks:
+            _openBanks.pop(bankPath).close()
+        convertCsv(csvPath, bankPath)
+
+    if bankPath not in _openBanks:
+        _openBanks[bankPath] = PuzzleBank(bankPath)
+    return _openBanks[bankPath]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a csv file of puzzles to a puzzle bank.")
+    parser.add_argument("csvPath", nargs='?', default='preGeneratedSudokuBoards.csv')
+    parser.add_argument("bankPath", nargs='?', default=None)
+    args = parser.parse_args()
+
+    bankPath = args.bankPath or os.path.splitext(args.csvPath)[0] + ".bank"
+    print(f"converted {convertCsv(args.csvPath, bankPath)} puzzles to {bankPath}")
@@ -0,0 +1,156 @@
+import os
+import struct
+
+from Variants import Variant
+
+# save file layout
+# header: magic, version, box size, bytes per notes mask, length of the variant json
+# snapshot: variant json (empty for a classic sudoku), givens (one bit per node), values (one byte per node),
+#           notes (one mask per node)
+# journal: moves since the snapshot, (kind, node index, value or notes mask) each, a torn move at the end
+#          (the game was killed while writing it) is ignored
+MAGIC = b"SDKS"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBH")
+MOVE = struct.Struct("<BHI")
+
+# kinds of moves
+VALUE, NOTES = 0, 1
+
+# the journal is folded into a new snapshot after this many moves
+COMPACT_AFTER = 256
+
+SAVE_PATH = 'savedBoard.sav'
+
+
+def packBits(flags):
+    packed = bytearray((len(flags) + 7) // 8)
+    for index, flag in enumerate(flags):
+        if flag:
+            packed[index >> 3] |= 1 << (index & 7)
+    return bytes(packed)
+
+
+def unpackBits(packed, count):
+    return [(packed[index >> 3] >> (index & 7)) & 1 for index in range(count)]
+
+
+class SaveFile:
+    """
+    Binary save of a board: a snapshot followed by a journal of the moves made since,
+    so saving after every key press only appends a few bytes.
+    """
+
+    def __init__(self, path=SAVE_PATH):
+        self.path = path
+        self.file = None
+        self.moves = 0
+
+        # what the file holds => the board as it was last saved
+        self.variant = None
+        self.givens = None
+        self.values = None
+        self.notes = None
+
+    def save(self, board):
+        # write a new snapshot of the whole board and start an empty journal, the old file is only
+        # replaced once the new one is complete
+        self.close()
+        variantJson = board.variant.toJson().encode() if board.variant.kind != "classic" else b""
+
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, board.box_size, board.notes.itemsize, len(variantJson)))
+            f.write(variantJson)
+            f.write(packBits(board.givens))
+            f.write(bytes(board.values))
+            f.write(board.notes.tobytes())
+        os.replace(tmpPath, self.path)
+        self.moves = 0
+        self.remember(board)
+
+    def sync(self, board):
+        # append the moves that were made since the last save, a new puzzle (or a long journal) gets a new snapshot
+        if self.values is None or board.variant != self.variant or board.givens != self.givens or \
+                board.notes.itemsize != self.notes.itemsize or self.moves >= COMPACT_AFTER:
+            self.save(board)
+            return
+
+        if board.values == self.values and board.notes == self.notes:
+            return
+
+        moves = bytearray()
+        for index, (value, oldValue) in enumerate(zip(board.values, self.values)):
+            if value != oldValue:
+                moves += MOVE.pack(VALUE, index, value)
+        for index, (mask, oldMask) in enumerate(zip(board.notes, self.notes)):
+            if mask != oldMask:
+                moves += MOVE.pack(NOTES, index, mask)
+
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        self.file.write(moves)
+        self.file.flush()
+        self.moves += len(moves) // MOVE.size
+        self.remember(board)
+
+    def load(self, board):
+        # set the board to the snapshot and replay the journal, returns False when there is no save file
+        if not os.path.exists(self.path):
+            return False
+
+        self.close()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        magic, version, boxSize, noteSize, variantLength = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a sudoku save")
+        position = HEADER.size
+        variant = Variant.fromJson(data[position:position + variantLength].decode()) if variantLength else \
+            Variant(boxSize=boxSize)
+        position += variantLength
+
+        board.setBoxSize(variant.boxSize, variant)
+        cells = board.width * board.height
+        if noteSize != board.notes.itemsize:
+            raise ValueError(f"{self.path} has notes of {noteSize} bytes instead of {board.notes.itemsize}")
+
+        givens = unpackBits(data[position:position + (cells + 7) // 8], cells)
+        position += (cells + 7) // 8
+        values = data[position:position + cells]
+        position += cells
+        notes = data[position:position + cells * noteSize]
+        position += cells * noteSize
+
+        board.setState(values + bytes(givens) + notes)
+
+        end = position + (len(data) - position) // MOVE.size * MOVE.size
+        for kind, index, value in MOVE.iter_unpack(data[position:end]):
+            if index >= cells:
+                continue
+            if kind == VALUE:
+                board.setValue(index % board.width, index // board.width, value)
+            elif kind == NOTES:
+                board.notes[index] = value
+        self.moves = (end - position) // MOVE.size
+
+        # a torn move at the end is cut off so that new moves are appended after the last whole one
+        if end != len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+
+        self.remember(board)
+        return True
+
+    def remember(self, board):
+        self.variant = board.variant
+        self.givens = board.givens[:]
+        self.values = board.values[:]
+        self.notes = board.notes[:]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
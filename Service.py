@@ -0,0 +1,436 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from Board import Board
+from BulkSolver import ENGINES
+from Propagation import boxSizeOf
+from PuzzleBank import formatPuzzle, parsePuzzle
+from Variants import Variant
+
+try:
+    from BatchValidator import validateBatch
+except ImportError:
+    validateBatch = None
+
+# requests of one kind that are sent to a worker together, a batch leaves once it is full
+# or BATCH_DELAY seconds after its first request
+BATCH_SIZE = 32
+BATCH_DELAY = 0.005
+
+# a generated puzzle takes up to seconds => every generate request is a batch of its own,
+# so that quick ones don't wait behind a big board, the same goes for searches on anything but a classic 9x9
+UNBATCHED = ("generate",)
+SEARCHES = ("solve", "count")
+
+# search nodes per second of the engines by box size (about half of what they do on an empty board) =>
+# a search gets the nodes it can do in its timeout, split between the requests of its batch,
+# so a batch is answered in time and an endless search gives up instead of holding a worker
+NODES_PER_SECOND = {
+    "propagation": {2: 20_000, 3: 5_000, 4: 1_500, 5: 800},
+    "dlx": {2: 80_000, 3: 60_000, 4: 15_000, 5: 1_000},
+}
+
+# requests that are queued or running at once, a connection isn't read any further while the service is full
+MAX_IN_FLIGHT = 256
+
+# bytes of one request line, longer ones are answered with an error
+STREAM_LIMIT = 1 << 16
+
+# seconds a request may take before it is answered with a timeout error
+TIMEOUT = 30.0
+
+# latencies kept for the stats
+LATENCY_SAMPLES = 10_000
+
+OPERATIONS = ("solve", "count", "validate", "generate")
+
+
+def parseVariant(request):
+    # the variant as written by Variant.toJson, None => a classic sudoku
+    if request.get("variant"):
+        return Variant.fromJson(request["variant"])
+    return None
+
+
+# worker side, every function gets the requests of one batch and returns a
+# ("ok", result) or ("error", message) pair for each of them
+
+def isBatchedSearch(request):
+    # classic 9x9 searches are quick enough to be batched
+    return not request.get("variant") and isinstance(request.get("puzzle"), str) and \
+        len(request["puzzle"].strip()) == 81
+
+
+def nodeBudget(request, seconds):
+    solver = request.get("solver", "propagation")
+    try:
+        boxSize = parseVariant(request).boxSize if request.get("variant") else \
+            boxSizeOf(len(parsePuzzle(request["puzzle"])))
+    except (KeyError, ValueError, TypeError):
+        return 1
+    return max(1, int(seconds * NODES_PER_SECOND.get(solver, NODES_PER_SECOND["propagation"]).get(boxSize, 100)))
+
+
+def _search(request, target_solutions, maxNodes):
+    engine = ENGINES[request.get("solver", "propagation")](parsePuzzle(request["puzzle"]), target_solutions,
+                                                           variant=parseVariant(request), max_nodes=maxNodes)
+    count = engine.solve()
+    if count < 0:
+        raise TimeoutError(f"the search gave up after {maxNodes} nodes")
+    return engine, count
+
+
+def _solve(request, maxNodes=0):
+    engine, count = _search(request, 1, maxNodes)
+    if count < 1:
+        raise ValueError("the puzzle has no solution")
+    return {"solution": formatPuzzle(engine.solutions[0]), "nodes": engine.nodes}
+
+
+def _count(request, maxNodes=0):
+    _, count = _search(request, request["limit"], maxNodes)
+    return {"count": count}
+
+
+def _validate(request, maxNodes=0):
+    # valid => no value repeats in a unit (or breaks a cage sum) and every empty node has a candidate left
+    values = parsePuzzle(request["puzzle"])
+    variant = parseVariant(request)
+    board = Board(variant=variant) if variant else Board(boxSizeOf(len(values)))
+    if len(values) != board.width * board.height:
+        raise ValueError(f"the puzzle has {len(values)} values instead of {board.width * board.height}")
+    board.setBoardWithDefaultValues(values)
+
+    valid = board.conflict_count == 0 and all(board.getCandidatesMask(node.x, node.y)
+                                              for node in board.getNodesWithoutValue())
+    return {"valid": valid, "solved": board.isSolved()}
+
+
+def _generate(request, maxNodes=0):
+    variant = parseVariant(request)
+    board = Board(variant=variant) if variant else Board(boxSize=int(request.get("boxSize", 3)))
+    board.generatePuzzle(rng=random.Random(request.get("seed")))
+    return {"puzzle": formatPuzzle(board.getValuesDefault()), "variant": board.variant.toJson()}
+
+
+def _validateAll(requests):
+    # classic puzzles of the same size are validated together with numpy, see BatchValidator
+    results = [None] * len(requests)
+    if validateBatch is not None:
+        groups = {}
+        for position, request in enumerate(requests):
+            try:
+                values = parsePuzzle(request["puzzle"])
+            except (KeyError, ValueError, TypeError):
+                continue
+            if not request.get("variant"):
+                groups.setdefault(len(values), []).append((position, values))
+
+        for cells, group in groups.items():
+            try:
+                batch = validateBatch([values for _, values in group], propagate=False)
+            except ValueError:
+                continue
+            for (position, _), valid, solved in zip(group, batch.valid, batch.solved):
+                results[position] = ("ok", {"valid": bool(valid), "solved": bool(solved)})
+
+    return [result or _runOne(_validate, request) for result, request in zip(results, requests)]
+
+
+def _runOne(function, request, maxNodes=0):
+    try:
+        return "ok", function(request, maxNodes)
+    except Exception as e:
+        return "error", f"{type(e).__name__}: {e}"
+
+
+def runBatch(operation, requests, maxNodes=None):
+    # maxNodes => the search budget of every request, 0 => no limit
+    if operation == "validate":
+        return _validateAll(requests)
+    function = {"solve": _solve, "count": _count, "generate": _generate}[operation]
+    return [_runOne(function, request, budget) for request, budget in zip(requests, maxNodes or [0] * len(requests))]
+
+
+class Stats:
+    """
+    Counters and recent latencies of the requests of one kind.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.batches = 0
+        self.batchedRequests = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def toJson(self, seconds):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "per_second": self.requests / seconds if seconds else 0.0,
+            "mean_batch": self.batchedRequests / self.batches if self.batches else 0.0,
+            "p50_ms": percentile(50),
+            "p99_ms": percentile(99),
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+class Service:
+    """
+    JSON lines server for solving, counting solutions, validating and generating puzzles.
+    Requests of one kind are batched and run on a process pool.
+    """
+
+    def __init__(self, workers=None, batchSize=BATCH_SIZE, batchDelay=BATCH_DELAY, maxInFlight=MAX_IN_FLIGHT,
+                 timeout=TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.batchSize = batchSize
+        self.batchDelay = batchDelay
+        self.maxInFlight = maxInFlight
+        self.timeout = timeout
+
+        self.executor = None
+        self.slots = None
+        self.inFlight = 0
+        self.startTime = time.perf_counter()
+
+        # requests waiting for their batch => operation -> [(request, future)] and the timer that sends it
+        self.pending = {operation: [] for operation in OPERATIONS}
+        self.timers = {}
+        self.stats = {operation: Stats() for operation in OPERATIONS}
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        # listen on a unix socket when path is given, on TCP otherwise
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.slots = asyncio.Semaphore(self.maxInFlight)
+
+        # the workers are forked on the first task => that happens before there are connections,
+        # a worker would keep a copy of every socket open at the time and they would never really close
+        await asyncio.get_running_loop().run_in_executor(self.executor, int)
+        if path:
+            return await asyncio.start_unix_server(self.handleConnection, path=path, limit=STREAM_LIMIT)
+        return await asyncio.start_server(self.handleConnection, host, port, limit=STREAM_LIMIT)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def handleConnection(self, reader, writer):
+        # every line is a request, the answers are written in the order they are done with the id of their request
+        tasks = set()
+        try:
+            while True:
+                line = await self.readLine(reader)
+                if line is None:
+                    writer.write(json.dumps({"ok": False, "error": f"a request is at most {STREAM_LIMIT} bytes"})
+                                 .encode() + b"\n")
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+
+                # backpressure => a request takes a slot and no more lines are read while the service is full,
+                # the slot is given back when the task is done, even when it is cancelled before it starts
+                await self.slots.acquire()
+                task = asyncio.ensure_future(self.answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: self.slots.release())
+
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    @staticmethod
+    async def readLine(reader):
+        # the next request line, b"" at the end of the stream and None for a line that is longer than
+        # STREAM_LIMIT, which is skipped up to its newline
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # the last line without a newline (empty at the end of the stream)
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+        try:
+            while True:
+                await reader.readexactly(consumed)
+                try:
+                    await reader.readuntil(b"\n")
+                    return None
+                except asyncio.LimitOverrunError as e:
+                    consumed = e.consumed
+        except asyncio.IncompleteReadError:
+            return b""
+
+    async def answer(self, line, writer):
+        self.inFlight += 1
+        try:
+            response = await self.handle(line)
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        finally:
+            self.inFlight -= 1
+
+    async def handle(self, line):
+        startTime = time.perf_counter()
+        try:
+            request = json.loads(line)
+            operation = request.get("op")
+        except (ValueError, AttributeError):
+            return {"ok": False, "error": "a request is one json object per line"}
+
+        response = {"id": request.get("id"), "ok": True}
+        if operation == "stats":
+            response.update(self.statsJson())
+            return response
+        if operation not in OPERATIONS:
+            response.update(ok=False, error=f"unknown op {operation!r}, use one of {', '.join(OPERATIONS)} or stats")
+            return response
+
+        stats = self.stats[operation]
+        stats.requests += 1
+        try:
+            self.checkRequest(operation, request)
+        except (ValueError, TypeError) as e:
+            stats.errors += 1
+            response.update(ok=False, error=str(e))
+            return response
+
+        future = asyncio.get_running_loop().create_future()
+        self.enqueue(operation, request, future)
+        try:
+            status, result = await asyncio.wait_for(future, request["timeout"])
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            status, result = "error", "timeout"
+
+        if status == "ok":
+            response.update(result)
+        else:
+            stats.errors += 1
+            response.update(ok=False, error=result)
+        stats.latencies.append(time.perf_counter() - startTime)
+        return response
+
+    def checkRequest(self, operation, request):
+        # the options are parsed here => a bad one is answered at once instead of failing in a worker,
+        # a request may ask for a shorter timeout than the one of the service but not for a longer one
+        try:
+            timeout = float(request.get("timeout", self.timeout))
+        except (ValueError, TypeError):
+            raise ValueError(f"timeout must be a number of seconds, not {request.get('timeout')!r}")
+        if not 0 < timeout:
+            raise ValueError("timeout must be more than 0 seconds")
+        request["timeout"] = min(timeout, self.timeout)
+
+        if operation == "count":
+            limit = request.get("limit", 2)
+            if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+                raise ValueError(f"limit must be a whole number of at least 1, not {limit!r}")
+            request["limit"] = limit
+
+    def enqueue(self, operation, request, future):
+        if operation in UNBATCHED or (operation in SEARCHES and not isBatchedSearch(request)):
+            asyncio.ensure_future(self.runBatch(operation, [(request, future)]))
+            return
+
+        pending = self.pending[operation]
+        pending.append((request, future))
+        if len(pending) >= self.batchSize or operation in UNBATCHED:
+            self.flush(operation)
+        elif operation not in self.timers:
+            self.timers[operation] = asyncio.get_running_loop().call_later(self.batchDelay, self.flush, operation)
+
+    def flush(self, operation):
+        timer = self.timers.pop(operation, None)
+        if timer is not None:
+            timer.cancel()
+
+        # requests that timed out while they were waiting aren't sent
+        batch = [(request, future) for request, future in self.pending[operation] if not future.done()]
+        self.pending[operation] = []
+        if batch:
+            asyncio.ensure_future(self.runBatch(operation, batch))
+
+    async def runBatch(self, operation, batch):
+        stats = self.stats[operation]
+        stats.batches += 1
+        stats.batchedRequests += len(batch)
+
+        # the requests of a batch run one after another => they share the time of the shortest timeout
+        requests = [request for request, _ in batch]
+        maxNodes = None
+        if operation in SEARCHES:
+            seconds = min(request["timeout"] for request in requests) / len(requests)
+            maxNodes = [nodeBudget(request, seconds) for request in requests]
+
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, runBatch, operation, requests, maxNodes)
+        except Exception as e:
+            results = [("error", f"{type(e).__name__}: {e}")] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def statsJson(self):
+        seconds = time.perf_counter() - self.startTime
+        return {
+            "uptime_s": seconds,
+            "in_flight": self.inFlight,
+            "workers": self.workers,
+            "operations": {operation: stats.toJson(seconds) for operation, stats in self.stats.items()},
+        }
+
+
+async def serve(host="127.0.0.1", port=8765, path=None, **options):
+    service = Service(**options)
+    server = await service.start(host, port, path)
+    print(f"listening on {path or f'{host}:{port}'} with {service.workers} workers")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve, count, validate and generate puzzles over JSON lines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="path of a unix socket to listen on instead of TCP")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batch-delay", type=float, default=BATCH_DELAY)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, workers=args.workers, batchSize=args.batch_size,
+                          batchDelay=args.batch_delay, maxInFlight=args.max_in_flight, timeout=args.timeout))
+    except KeyboardInterrupt:
+        pass
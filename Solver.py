@@ -1,21 +1,48 @@
+import Instrumentation
+from Canonical import canonicalForm, solutionCache
+from DancingLinks import DancingLinks, count_solutions
+from Propagation import PropagationSolver
+
+
 class Solver:
-    def __init__(self, board, solver_type):
+    def __init__(self, board, solver_type, cache=solutionCache):
         self.board = board
         self.number_of_solutions = 0
         self.solver_type = solver_type
+        # propagation and dlx look up puzzles (and the puzzles that are the same up to symmetry) here first,
+        # None => always search
+        self.cache = cache
+
+        # search statistics of the last solve
+        self.nodes = 0
+        self.backtracks = 0
+        self.cached = False
+        # values of the board at the first solution of the backtracking search, None => none found yet
+        self.first_solution = None
+
+    def solve(self, target_solutions=1):
+        # with an Instrumentation sink the solve is counted and timed, without one this check is all it costs
+        if Instrumentation.sink is not None:
+            return Instrumentation.solveInstrumented(self, target_solutions)
+        return self.run(target_solutions)
 
-    def solve(self):
+    def run(self, target_solutions=1):
         if self.solver_type == "backtracking":
-            return self.backtracking_solver()
-        elif self.solver_type == "brute_force":
-            return self.brute_force_solver()
+            return self.backtracking_solver(target_solutions)
+        elif self.solver_type == "propagation":
+            return self.propagation_solver(target_solutions)
+        elif self.solver_type == "dlx":
+            return self.dlx_solver(target_solutions)
         else:
-            raise ValueError("Invalid solver type. Use 'backtracking' or 'brute_force'.")
+            raise ValueError("Invalid solver type. Use 'backtracking', 'propagation' or 'dlx'.")
 
     def backtracking_solver_tick(self, last_node_values, current_index, empty_nodes, target_solutions):
         # If we've examined all empty cells, we found a solution
         if current_index >= len(empty_nodes):
             self.number_of_solutions += 1
+            # the search goes on for more solutions => the first one is kept to be put back at the end
+            if self.number_of_solutions == 1:
+                self.first_solution = self.board.getValues()
             # If we found the target number of solutions, return signal to stop
             if target_solutions > 0 and self.number_of_solutions == target_solutions:
                 return -1, self.number_of_solutions
@@ -27,41 +54,93 @@ class Solver:
         current_value = last_node_values[node]
 
         found = False   
-        # Try values from current_value to 9         
-        for value in range(current_value, 10):
+        # Try values from current_value to the board width (9 for 9x9)
+        for value in range(current_value, self.board.width + 1):
             # Here we check the constraints of the Sudoku board
             if self.board.isNodeValid(x, y, value, check_only_if_is_valid=True):
                 # If the value is valid, set it on the board
                 self.board.setValue(x, y, value)
                 last_node_values[node] = value + 1
+                self.nodes += 1
                 found = True
                 return current_index + 1, self.number_of_solutions
 
         if not found:
             self.board.setValue(x, y, 0)
             last_node_values[node] = 1
+            self.backtracks += 1
             current_index -= 1
             if current_index < 0:
                 return -1, self.number_of_solutions
             return current_index, self.number_of_solutions
 
-    def backtracking_solver(self):
+    def backtracking_solver(self, target_solutions=1):
         empty_nodes = self.board.getNodesWithoutValue()
         if not empty_nodes:
             return 1
         
         last_node_values = {}
-        target_solutions = 1
         self.number_of_solutions = 0
+        self.nodes = 0
+        self.backtracks = 0
+        self.first_solution = None
 
         for node in empty_nodes:
             last_node_values[node] = 1
 
         current_index = 0
-        while current_index >= 0 and current_index < len(empty_nodes):
+        while current_index >= 0:
             current_index, _ = self.backtracking_solver_tick(
                 last_node_values, current_index, empty_nodes, target_solutions
             )
 
+        # counting more than one solution backtracks through every node => the first solution is put back
+        if self.first_solution is not None and self.number_of_solutions != target_solutions:
+            self.apply_solution(self.first_solution)
         return self.number_of_solutions
 
+    def propagation_solver(self, target_solutions=1):
+        return self.cached_solver(PropagationSolver, target_solutions)
+
+    def dlx_solver(self, target_solutions=1):
+        return self.cached_solver(DancingLinks, target_solutions)
+
+    def cached_solver(self, engine_type, target_solutions):
+        values = self.board.getValues()
+
+        # symmetries of the variants aren't the ones of the classic sudoku => they aren't cached
+        form = None
+        self.cached = False
+        if self.cache is not None and self.board.variant.kind == "classic":
+            form = canonicalForm(values)
+            cached = self.cache.get(form, target_solutions)
+            if cached:
+                self.number_of_solutions, solution = cached
+                self.nodes = self.backtracks = 0
+                self.cached = True
+                if solution:
+                    self.apply_solution(solution)
+                return self.number_of_solutions
+
+        engine = engine_type(values, target_solutions, variant=self.board.variant)
+        self.apply_engine(engine)
+        if form:
+            self.cache.put(form, self.number_of_solutions, engine.solutions[0] if engine.solutions else None,
+                           target_solutions)
+        return self.number_of_solutions
+
+    def apply_engine(self, engine):
+        self.number_of_solutions = engine.solve()
+        self.nodes = engine.nodes
+        self.backtracks = engine.backtracks
+
+        # write the first solution back to the empty nodes
+        if engine.solutions:
+            self.apply_solution(engine.solutions[0])
+
+        return self.number_of_solutions
+
+    def apply_solution(self, solution):
+        for node in self.board.getNodesWithoutValue():
+            self.board.setValue(node.x, node.y, solution[node.y * self.board.width + node.x])
+
@@ -0,0 +1,140 @@
+import json
+import random
+from collections import deque
+from typing import List, NamedTuple, Tuple
+
+KINDS = ["classic", "diagonal", "jigsaw", "killer"]
+
+
+class Variant(NamedTuple):
+    """
+    Rules of a sudoku beyond rows and columns: the region of every cell (the boxes when empty),
+    both main diagonals for the diagonal kind and the killer cages as (sum, cells) pairs.
+    Cells of a cage hold different values that add up to the sum.
+    """
+    kind: str = "classic"
+    boxSize: int = 3
+    regions: Tuple[int, ...] = ()
+    cages: Tuple[Tuple[int, Tuple[int, ...]], ...] = ()
+
+    def regionOf(self) -> List[int]:
+        # region index of every cell
+        return list(self.regions) or boxRegions(self.boxSize)
+
+    def units(self) -> List[List[int]]:
+        # every group of cells that holds each value exactly once => rows, columns, regions and diagonals
+        size = self.boxSize * self.boxSize
+        units = [[y * size + x for x in range(size)] for y in range(size)] + \
+                [[y * size + x for y in range(size)] for x in range(size)]
+
+        regions = [[] for _ in range(size)]
+        for cell, region in enumerate(self.regionOf()):
+            regions[region].append(cell)
+        return units + regions + self.extraUnits()
+
+    def extraUnits(self) -> List[List[int]]:
+        # the units on top of rows, columns and regions => the diagonals
+        size = self.boxSize * self.boxSize
+        if self.kind == "diagonal":
+            return [[i * size + i for i in range(size)], [i * size + size - 1 - i for i in range(size)]]
+        return []
+
+    def toJson(self):
+        return json.dumps([self.kind, self.boxSize, list(self.regions), [[total, list(cells)] for total, cells in self.cages]])
+
+    @staticmethod
+    def fromJson(text):
+        kind, boxSize, regions, cages = json.loads(text)
+        return Variant(kind, boxSize, tuple(regions), tuple((total, tuple(cells)) for total, cells in cages))
+
+
+def boxRegions(boxSize):
+    size = boxSize * boxSize
+    return [(y // boxSize) * boxSize + x // boxSize for y in range(size) for x in range(size)]
+
+
+def _neighbours(cell, size):
+    y, x = divmod(cell, size)
+    if x > 0:
+        yield cell - 1
+    if x < size - 1:
+        yield cell + 1
+    if y > 0:
+        yield cell - size
+    if y < size - 1:
+        yield cell + size
+
+
+def _isConnected(cells, size):
+    cells = set(cells)
+    start = next(iter(cells))
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        for neighbour in _neighbours(queue.popleft(), size):
+            if neighbour in cells and neighbour not in seen:
+                seen.add(neighbour)
+                queue.append(neighbour)
+    return len(seen) == len(cells)
+
+
+def randomRegions(boxSize=3, rng=random, swaps=None):
+    # jigsaw regions => start with the boxes and swap neighbouring cells of two regions
+    # as long as both regions stay connected
+    size = boxSize * boxSize
+    regionOf = boxRegions(boxSize)
+    regions = [set() for _ in range(size)]
+    for cell, region in enumerate(regionOf):
+        regions[region].add(cell)
+
+    for _ in range(swaps or 4 * size * size):
+        first = rng.randrange(size * size)
+        second = rng.choice(list(_neighbours(first, size)))
+        a, b = regionOf[first], regionOf[second]
+        if a == b:
+            continue
+
+        # first moves to b, a cell of b next to region a moves to a
+        candidates = [cell for cell in regions[b] if cell != second and
+                      any(regionOf[neighbour] == a and neighbour != first for neighbour in _neighbours(cell, size))]
+        if not candidates:
+            continue
+        other = rng.choice(candidates)
+
+        newA = regions[a] - {first} | {other}
+        newB = regions[b] - {other} | {first}
+        if _isConnected(newA, size) and _isConnected(newB, size):
+            regions[a], regions[b] = newA, newB
+            regionOf[first], regionOf[other] = b, a
+
+    return tuple(regionOf)
+
+
+def randomCages(solution, boxSize=3, rng=random, maxCageSize=4):
+    # killer cages of a solved grid => connected groups of cells with different values
+    size = boxSize * boxSize
+    cageOf = [-1] * (size * size)
+    cages = []
+
+    cells = list(range(size * size))
+    rng.shuffle(cells)
+    for start in cells:
+        if cageOf[start] != -1:
+            continue
+
+        cage = [start]
+        cageOf[start] = len(cages)
+        targetSize = rng.randint(2, maxCageSize)
+        while len(cage) < targetSize:
+            used = {solution[cell] for cell in cage}
+            options = [neighbour for cell in cage for neighbour in _neighbours(cell, size)
+                       if cageOf[neighbour] == -1 and solution[neighbour] not in used]
+            if not options:
+                break
+            cell = rng.choice(options)
+            cageOf[cell] = len(cages)
+            cage.append(cell)
+
+        cages.append(cage)
+
+    return tuple(sorted((sum(solution[cell] for cell in cage), tuple(sorted(cage))) for cage in cages))